@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ DistanceAlongRiverBatch
+                                 A QGIS plugin
+ Calculate distances between pair of points along many river reaches at once
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (QgsProcessing,
+                       QgsProcessingParameterFileDestination,
+                       QgsProcessingParameterVectorLayer,
+                       QgsProcessingParameterField,
+                       QgsProcessingParameterBoolean,
+                       QgsProcessingParameterNumber,
+                       QgsProcessingMultiStepFeedback,
+                       QgsFeatureRequest,
+                       QgsUnitTypes,
+                       NULL)
+from .distance_along_river_processing_algorithm import DistanceAlongRiverAlgorithm
+
+
+class DistanceAlongRiverBatchAlgorithm(DistanceAlongRiverAlgorithm):
+    """
+    Distance along river for many river reaches in one run : points of both
+    layers are partitioned by reach id, and each partition is projected on
+    the centerline of its own reach. Results of all reaches are written to
+    one table.
+    """
+
+    # other parameters have the same names as in DistanceAlongRiverAlgorithm
+    REACHFIELD1 = 'REACHFIELD1'
+    REACHFIELD2 = 'REACHFIELD2'
+    RIVER_REACHFIELD = 'RIVER_REACHFIELD'
+
+    def initAlgorithm(self, config):
+        """
+        Here we define the inputs and output of the algorithm, along
+        with some other properties.
+        """
+
+        # 1st input point layer
+        self.addParameter(
+            QgsProcessingParameterVectorLayer(
+                self.INPUT1,
+                self.tr('First input point layer'),
+                [QgsProcessing.TypeVectorPoint]
+            )
+        )
+            
+        # id and reach id fields for 1st input layer
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.IDFIELD1,
+                self.tr('ID field for first input layer'),
+                '',
+                self.INPUT1
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.REACHFIELD1,
+                self.tr('Reach ID field for first input layer'),
+                '',
+                self.INPUT1
+            )
+        )
+            
+        # 2nd input point layer
+        self.addParameter(
+            QgsProcessingParameterVectorLayer(
+                self.INPUT2,
+                self.tr('Second input point layer'),
+                [QgsProcessing.TypeVectorPoint]
+            )
+        )
+            
+        # id and reach id fields for 2nd input layer
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.IDFIELD2,
+                self.tr('ID field for second input layer'),
+                '',
+                self.INPUT2
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.REACHFIELD2,
+                self.tr('Reach ID field for second input layer'),
+                '',
+                self.INPUT2
+            )
+        )
+            
+        # river lines, with their reach id
+        self.addParameter(
+            QgsProcessingParameterVectorLayer(
+                self.RIVER,
+                self.tr('Input river centerline layer'),
+                [QgsProcessing.TypeVectorLine]
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.RIVER_REACHFIELD,
+                self.tr('Reach ID field for river layer'),
+                '',
+                self.RIVER
+            )
+        )
+            
+        # reaches with several branches : distances along river are shortest paths in the network
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.NETWORK,
+                self.tr('Reaches are networks of branches (braided channels, tributaries)'),
+                defaultValue = False
+            )
+        )
+            
+        # compute straight line distances in layer crs instead of on ellipsoid
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.PLANAR_DISTANCES,
+                self.tr('Calculate straight line distances in layer coordinate system (only if projected in meters)'),
+                defaultValue = False
+            )
+        )
+            
+        # number of decimals of distances in output table
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.DECIMALS,
+                self.tr('Number of decimals of distances in output table'),
+                QgsProcessingParameterNumber.Integer,
+                defaultValue = 2,
+                minValue = 0
+            )
+        )
+            
+        # output table
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                    self.OUTPUT_TABLE,
+                    self.tr('Table with distances between points (CSV, GeoPackage or Parquet file)'),
+                    self.tr('CSV files (*.csv);;GeoPackage files (*.gpkg);;Parquet files (*.parquet)')
+            )
+        )
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """
+        Here is where the processing itself takes place.
+        """
+        # heavy modules are imported when algorithm runs, as in DistanceAlongRiverAlgorithm
+        import numpy as np
+        from .river_engine.api import load_centerline, merge_lines, project
+        from .river_engine.profiling import SharedProgress
+        from .river_engine.tables import REAL, TEXT, TableWriter, format_available, table_format
+        
+        # Retrieve inputs and outputs
+        input1 = self.parameterAsVectorLayer(parameters, self.INPUT1, context)
+        idfield1 = self.parameterAsString(parameters, self.IDFIELD1, context)
+        reachfield1 = self.parameterAsString(parameters, self.REACHFIELD1, context)
+        input2 = self.parameterAsVectorLayer(parameters, self.INPUT2, context)
+        idfield2 = self.parameterAsString(parameters, self.IDFIELD2, context)
+        reachfield2 = self.parameterAsString(parameters, self.REACHFIELD2, context)
+        river = self.parameterAsVectorLayer(parameters, self.RIVER, context)
+        river_reachfield = self.parameterAsString(parameters, self.RIVER_REACHFIELD, context)
+        network = self.parameterAsBool(parameters, self.NETWORK, context)
+        planar = self.parameterAsBool(parameters, self.PLANAR_DISTANCES, context)
+        decimal_count = self.parameterAsInt(parameters, self.DECIMALS, context)
+        table_output_path = self.parameterAsFileOutput(parameters, self.OUTPUT_TABLE, context)
+        # columns of output table : reach, ids of points, straight line and along-river distances
+        columns = [('reach', TEXT), ('ID1', TEXT), ('ID2', TEXT), ('straight_dist', REAL), ('river_dist', REAL)]
+        reach_colname = columns[0][0]
+        
+        # check input parameters
+        check = self.checkParameters(input1, input2, river, context, feedback)
+        if check == "problem":
+            return {}
+        if not format_available(table_format(table_output_path)):
+            message = 'Writing Parquet tables needs the pyarrow Python package, please choose a CSV or GeoPackage table'
+            feedback.reportError(QCoreApplication.translate('Distance along river', message))
+            return {}
+        crs = input1.crs()
+        geodesic = not (planar and not crs.isGeographic() and crs.mapUnits() == QgsUnitTypes.DistanceMeters)
+        
+        
+        # 1/ READ RIVER LINES AND POINTS ONCE, GROUPED BY REACH
+        ####################################################################################
+        
+        message = 'Reading river reaches and points...'
+        feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
+        reaches = self.riverReaches(river, river_reachfield)
+        points1 = self.reachPoints(input1, idfield1, reachfield1, geodesic, context)
+        points2 = self.reachPoints(input2, idfield2, reachfield2, geodesic, context)
+        missing = set(points1) | set(points2)
+        missing.difference_update(reaches)
+        if missing:
+            message = f'{len(missing)} reach ids of points are not in river layer, these points are left out'
+            feedback.pushWarning(QCoreApplication.translate('Distance along river', message))
+        
+        
+        # 2/ PROJECT POINTS OF EACH REACH ON ITS CENTERLINE AND CALCULATE DISTANCES
+        ####################################################################################
+        
+        measure = self.centerlineMeasure(crs)
+        empty = ([], np.empty(0), np.empty(0), np.empty(0), np.empty(0))
+        # each reach is a step of progress, moving forward while its points are projected
+        reach_feedback = QgsProcessingMultiStepFeedback(len(reaches), feedback)
+        with TableWriter(table_output_path, columns) as writer:
+            for i, (reach, geometries) in enumerate(reaches.items()):
+                if feedback.isCanceled():
+                    return {}
+                reach_feedback.setCurrentStep(i)
+                if reach not in points1 and reach not in points2:
+                    continue
+                try:
+                    river_axis = load_centerline(merge_lines(geometries), measure, network)
+                except ValueError:
+                    message = f'Centerline of reach {reach} is empty, its points are left out'
+                    feedback.pushWarning(QCoreApplication.translate('Distance along river', message))
+                    continue
+                ids1, xs1, ys1, straight_xs1, straight_ys1 = points1.get(reach, empty)
+                ids2, xs2, ys2, straight_xs2, straight_ys2 = points2.get(reach, empty)
+                # both partitions are projected on the same centerline, its spatial index is built once
+                progress = SharedProgress(reach_feedback, 2)
+                result1 = project(river_axis, xs1, ys1, progress.task(0))
+                result2 = project(river_axis, xs2, ys2, progress.task(1))
+                if result1 is None or result2 is None:
+                    return {}
+                df_result = self.calculateDistances(crs, (ids1, straight_xs1, straight_ys1, result1['chainage'], result1['segment']),
+                                                    (ids2, straight_xs2, straight_ys2, result2['chainage'], result2['segment']),
+                                                    columns[1:], geodesic, river_axis, feedback)
+                if df_result is None or feedback.isCanceled():
+                    return {}
+                df_result.insert(0, reach_colname, reach)
+                df_result = self.dfCalculations(df_result, columns, decimal_count)
+                writer.write(df_result)
+        
+        
+        # 3/ LOAD AND RETURN OUTPUT TABLE
+        ####################################################################################
+        
+        self.loadTable(table_output_path, context)
+        return {self.OUTPUT_TABLE: table_output_path}
+    
+    
+    # FUNCTIONS
+    ####################################################################################
+    
+    # geometries of river lines grouped by reach id, in a dictionary
+    def riverReaches(self, river, reachfield):
+        request = QgsFeatureRequest().setSubsetOfAttributes([reachfield], river.fields())
+        reaches = {}
+        for f in river.getFeatures(request):
+            if f.hasGeometry() and f[reachfield] != NULL:
+                reaches.setdefault(f[reachfield], []).append(f.geometry())
+        return reaches
+    
+    # points of a layer grouped by reach id, read in a single pass
+    # returns a dictionary with reach ids as keys and (ids, x array, y array, x array, y array) as values,
+    # the last 2 arrays being coordinates for straight line distances, geographic if geodesic is True
+    def reachPoints(self, layer, idfield, reachfield, geodesic, context):
+        import numpy as np
+        import pandas as pd
+        request = QgsFeatureRequest().setSubsetOfAttributes([idfield, reachfield], layer.fields())
+        ids, reaches, xs, ys = [], [], [], []
+        for f in layer.getFeatures(request):
+            if not f.hasGeometry():
+                continue
+            geom = f.geometry()
+            pt = geom.asMultiPoint()[0] if geom.isMultipart() else geom.asPoint()
+            ids.append(f[idfield] if f[idfield] != NULL else None)
+            reaches.append(f[reachfield] if f[reachfield] != NULL else None)
+            xs.append(pt.x())
+            ys.append(pt.y())
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        straight_xs, straight_ys = xs, ys
+        if geodesic:
+            straight_xs, straight_ys = self.toGeographic(xs, ys, layer.crs(), context.transformContext())
+        ids = np.asarray(ids, dtype=object)
+        # indices of points of each reach, points without reach id are left out
+        reaches = pd.Series(reaches, dtype=object)
+        groups = reaches.groupby(reaches).indices
+        return {reach: (ids[rows].tolist(), xs[rows], ys[rows], straight_xs[rows], straight_ys[rows])
+                for reach, rows in groups.items()}
+
+    def name(self):
+        """
+        Returns the algorithm name, used for identifying the algorithm. This
+        string should be fixed for the algorithm, and must not be localised.
+        The name should be unique within each provider. Names should contain
+        lowercase alphanumeric characters only and no spaces or other
+        formatting characters.
+        """
+        return 'Distance along river (batch)'
+
+    def createInstance(self):
+        return DistanceAlongRiverBatchAlgorithm()
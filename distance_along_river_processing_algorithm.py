@@ -39,19 +39,31 @@ from qgis.core import (QgsProcessing,
                        QgsProcessingParameterFileDestination,
                        QgsWkbTypes,
                        QgsProcessingParameterVectorLayer,
+                       QgsProcessingParameterEnum,
                        QgsProcessingParameterField,
                        QgsVectorLayer,
-                       QgsProject,
                        QgsCoordinateReferenceSystem,
                        QgsFields,
                        QgsField,
                        QgsProcessingUtils,
                        QgsCoordinateTransform,
-                       QgsDistanceArea,
                        QgsPointXY,
+                       QgsFeature,
+                       QgsFeatureRequest,
+                       QgsFeatureSink,
+                       QgsGeometry,
+                       QgsProcessingParameterBoolean,
+                       QgsProcessingParameterNumber,
+                       QgsProcessingParameterPoint,
+                       QgsProcessingMultiStepFeedback,
+                       QgsUnitTypes,
+                       QgsLineString,
+                       QgsVectorLayerFeatureSource,
                        NULL)
-import processing
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from .river_engine.profiling import StageProfiler
+from .river_tools_utils import (CENTERLINE_METHODS, CENTERLINE_METHOD_NAMES, PROJECTION_STORE_PATH,
+                                createCenterline, layerFeatureCount, mergedLineParts)
 
 
 class DistanceAlongRiverAlgorithm(QgsProcessingAlgorithm):
@@ -77,11 +89,25 @@ class DistanceAlongRiverAlgorithm(QgsProcessingAlgorithm):
     INPUT2 = 'INPUT2'
     IDFIELD2 = 'IDFIELD2'
     RIVER = 'RIVER'
+    NETWORK = 'NETWORK'
+    PLANAR_DISTANCES = 'PLANAR_DISTANCES'
+    OUTPUT_MODE = 'OUTPUT_MODE'
+    MAX_RIVER_DISTANCE = 'MAX_RIVER_DISTANCE'
+    FLOW_DIRECTION = 'FLOW_DIRECTION'
+    OUTLET = 'OUTLET'
+    DECIMALS = 'DECIMALS'
+    INCREMENTAL = 'INCREMENTAL'
+    CENTERLINE_METHOD = 'CENTERLINE_METHOD'
     PROJECTED_POINTS = 'PROJECTED_POINTS'
     OUTPUT_TABLE = 'OUTPUT_TABLE'
     CENTERLINE_OUTPUT = 'CENTERLINE_OUTPUT'
     PROJECTED1 = 'PROJECTED1'
     PROJECTED2 = 'PROJECTED2'
+    PROFILE = 'PROFILE'
+    
+    # stages of the algorithm, in order, used for progress and profiling
+    STAGES = ['createCenterline', 'loadCenterline', 'projectPoints', 'saveProjectedPoints',
+              'calculateDistances', 'addFeaturestoTable', 'writeDistanceMatrix']
 
     def initAlgorithm(self, config):
         """
@@ -136,12 +162,102 @@ class DistanceAlongRiverAlgorithm(QgsProcessingAlgorithm):
             )
         )
             
+        # method used to create centerline if input layer is polygon
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.CENTERLINE_METHOD,
+                self.tr('Method used to create centerline if input layer is polygon'),
+                [self.tr(name) for name in CENTERLINE_METHOD_NAMES],
+                defaultValue = 0
+            )
+        )
+            
+        # river with several branches : distances along river are shortest paths in the network
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.NETWORK,
+                self.tr('River is a network of branches (braided channels, tributaries)'),
+                defaultValue = False
+            )
+        )
+            
+        # compute straight line distances in layer crs instead of on ellipsoid
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.PLANAR_DISTANCES,
+                self.tr('Calculate straight line distances in layer coordinate system (only if projected in meters)'),
+                defaultValue = False
+            )
+        )
+            
+        # pairs of points with same id, or all pairs of points
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.OUTPUT_MODE,
+                self.tr('Pairs of points in output table'),
+                [self.tr('Points with the same id in both layers'), self.tr('All pairs of points (distance matrix)')],
+                defaultValue = 0
+            )
+        )
+            
+        # maximum distance along river of pairs in distance matrix
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.MAX_RIVER_DISTANCE,
+                self.tr('Only keep pairs closer than this distance along river in distance matrix (0 : keep all pairs)'),
+                QgsProcessingParameterNumber.Double,
+                defaultValue = 0,
+                minValue = 0
+            )
+        )
+            
+        # sign distances along river by flow direction, flow direction being given by lines direction or by an outlet point
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.FLOW_DIRECTION,
+                self.tr('Sign distances along river by flow direction (positive if second point is downstream of first point)'),
+                options = [self.tr('No'),
+                           self.tr('Yes, river lines are drawn downstream'),
+                           self.tr('Yes, flowing towards river outlet point')],
+                defaultValue = 0
+            )
+        )
+            
+        # outlet of river, used to orient distances
+        self.addParameter(
+            QgsProcessingParameterPoint(
+                self.OUTLET,
+                self.tr('River outlet point'),
+                optional = True
+            )
+        )
+            
+        # number of decimals of distances in output table
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.DECIMALS,
+                self.tr('Number of decimals of distances in output table'),
+                QgsProcessingParameterNumber.Integer,
+                defaultValue = 2,
+                minValue = 0
+            )
+        )
+            
+        # reuse projections of points from previous runs
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.INCREMENTAL,
+                self.tr('Only project points that are new or have moved since previous runs on the same river'),
+                defaultValue = False
+            )
+        )
+            
         # output table
         self.addParameter(
             QgsProcessingParameterFileDestination(
                     self.OUTPUT_TABLE,
-                    self.tr('Table with distances between points (CSV file)'),
-                    self.tr('CSV files (*.csv)'),
+                    self.tr('Table with distances between points (CSV, GeoPackage or Parquet file)'),
+                    self.tr('CSV files (*.csv);;GeoPackage files (*.gpkg);;Parquet files (*.parquet)'),
                     optional = True
             )
         )
@@ -173,11 +289,27 @@ class DistanceAlongRiverAlgorithm(QgsProcessingAlgorithm):
                 optional=True
             )
         )
+            
+        # optional profile of the algorithm : time, memory and number of features of each stage
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                    self.PROFILE,
+                    self.tr('Profile with time and memory of each stage (JSON file)'),
+                    self.tr('JSON files (*.json)'),
+                    optional = True,
+                    createByDefault = False
+            )
+        )
 
     def processAlgorithm(self, parameters, context, feedback):
         """
         Here is where the processing itself takes place.
         """
+        # numpy, pandas and river_engine modules are imported by the methods using them, when algorithm runs,
+        # so that loading the provider when QGIS starts doesn't import them
+        from .river_engine.api import flow_sides, locate_outlet
+        from .river_engine.projection_store import ProjectionStore
+        from .river_engine.tables import REAL, TEXT, format_available, table_format
         
         # Retrieve inputs and outputs
         input1 = self.parameterAsVectorLayer(parameters, self.INPUT1, context)
@@ -185,10 +317,22 @@ class DistanceAlongRiverAlgorithm(QgsProcessingAlgorithm):
         input2 = self.parameterAsVectorLayer(parameters, self.INPUT2, context)
         idfield2 = self.parameterAsString(parameters, self.IDFIELD2, context)
         river = self.parameterAsVectorLayer(parameters, self.RIVER, context)
+        network = self.parameterAsBool(parameters, self.NETWORK, context)
+        planar = self.parameterAsBool(parameters, self.PLANAR_DISTANCES, context)
+        matrix = self.parameterAsEnum(parameters, self.OUTPUT_MODE, context) == 1
+        max_river_distance = self.parameterAsDouble(parameters, self.MAX_RIVER_DISTANCE, context)
+        flow_direction = self.parameterAsEnum(parameters, self.FLOW_DIRECTION, context)
+        flow = flow_direction > 0
+        decimal_count = self.parameterAsInt(parameters, self.DECIMALS, context)
+        incremental = self.parameterAsBool(parameters, self.INCREMENTAL, context)
         projected1 = self.parameterAsOutputLayer(parameters, self.PROJECTED1, context)
         projected2 = self.parameterAsOutputLayer(parameters, self.PROJECTED2, context)
         # get output path for future distance table as string
         table_output_path = self.parameterAsOutputLayer(parameters, self.OUTPUT_TABLE, context)
+        profile_path = self.parameterAsFileOutput(parameters, self.PROFILE, context)
+        # progress is reported stage by stage, while stages are timed
+        feedback = QgsProcessingMultiStepFeedback(len(self.STAGES), feedback)
+        profiler = StageProfiler(self.STAGES, feedback, trace_memory=bool(profile_path))
         # before creating output distance table, its fields must be defined
         #field_list = [['ID1', QVariant.Int], ['ID2', QVariant.Int], ['straight_dist', QVariant.Double], ['river_dist', QVariant.Double]]
         field_list = [['ID1', QVariant.String], ['ID2', QVariant.String], ['straight_dist', QVariant.Double], ['river_dist', QVariant.Double]]
@@ -196,42 +340,45 @@ class DistanceAlongRiverAlgorithm(QgsProcessingAlgorithm):
         for fieldname, fieldtype in field_list:
             fields.append(QgsField(fieldname, fieldtype))
         
-        # column names for future distance table
+        # columns of output table, written chunk by chunk
         # normally, same value for 1st and 2pt ids but sometimes an id is present in only one layer
-        id1_colname = field_list[0][0] # ID of 1st point
-        id2_colname = field_list[1][0] # ID of 2nd point
-        dist_colname = field_list[2][0] # straight line distance between pair of points
-        riverdist_colname = field_list[3][0] # along-river distance between pair of projected points
+        table_columns = [(fieldname, TEXT if fieldtype == QVariant.String else REAL) for fieldname, fieldtype in field_list]
         
         # check input parameters
         check = self.checkParameters(input1, input2, river, context, feedback)
         # exit plugin if input parameters are not valid
         if check == "problem":
             return{}
+        if not format_available(table_format(table_output_path)):
+            message = 'Writing Parquet tables needs the pyarrow Python package, please choose a CSV or GeoPackage table'
+            feedback.reportError(QCoreApplication.translate('Distance along river', message))
+            return {}
+        # without outlet point, flow direction is given by the direction of river lines
+        # a network has no single direction, and a centerline calculated from a polygon has an arbitrary one
+        if flow_direction == 1 and (network or river.geometryType() == QgsWkbTypes.PolygonGeometry):
+            message = 'Flow direction of a river network or polygon can only be given by a river outlet point'
+            feedback.reportError(QCoreApplication.translate('Distance along river', message))
+            return {}
+        if flow_direction == 2 and not parameters.get(self.OUTLET):
+            message = 'Please choose a river outlet point to sign distances by flow direction'
+            feedback.reportError(QCoreApplication.translate('Distance along river', message))
+            return {}
         
         
-        # 1/ PREPARATION : CREATE CENTERLINE IF NEEDED, MERGE LINES IN CENTERLINE IF NEEDED
+        # 1/ PREPARATION : CREATE CENTERLINE IF NEEDED
         ####################################################################################
         
         # if river layer is polygon, calculate the centerline for the input layer
         if river.geometryType() == QgsWkbTypes.PolygonGeometry :
             message = 'river is polygon, calculating centerline...'
             feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
-            centerline = self.createCenterline(river, parameters, context, feedback)
-            centerline_layer = QgsVectorLayer(centerline, "centerline", "ogr")
-            QgsProject.instance().addMapLayer(centerline_layer)
+            with profiler.stage('createCenterline', layerFeatureCount(river)):
+                centerline = self.createCenterline(river, parameters, context, feedback)
+            centerline_layer = QgsProcessingUtils.mapLayerFromString(centerline, context)
         # if input layer is line, it is considered as centerline
+        # its lines are merged in memory when loading centerline, branches of a network are split at junctions
         if river.geometryType() == QgsWkbTypes.LineGeometry:
             centerline_layer = river
-            # if centerline is composed of multiple lines, merge them
-            features = centerline_layer.getFeatures()
-            nb_features = sum(1 for _ in features)
-            if nb_features > 1:
-                message = 'merging lines in river layer...'
-                feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
-                centerline = self.mergeLines(centerline_layer, context, feedback)
-                centerline_layer = QgsVectorLayer(centerline, "centerline", "ogr")
-                QgsProject.instance().addMapLayer(centerline_layer)
         # if input layer is point, exit plugin
         if river.geometryType() == QgsWkbTypes.PointGeometry:
             message = 'Please choose a polygon or line layer for input river layer'
@@ -242,85 +389,103 @@ class DistanceAlongRiverAlgorithm(QgsProcessingAlgorithm):
         # 2/ PROJECT POINTS FROM INPUT LAYERS ON RIVER CENTERLINE
         ####################################################################################
         
-        # get names or full path for 1st point layer and centerline
-        layer_list1 = [input1, centerline_layer]
-        call_layer_list1 = self.callableLayers(layer_list1, feedback)
-        # projecting points for 1st point layer
-        message = 'Projecting 1st input layer on river...'
-        feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
-        layer_projected1 = self.projectPoints(layer_list1, call_layer_list1, projected1, [idfield1], context, feedback)
+        # load centerline vertices once, it is shared by both point layers
+        with profiler.stage('loadCenterline') as stage:
+            river_axis = self.loadCenterline(centerline_layer, input1.crs(), network, feedback)
+            stage['features'] = river_axis.segment_count if river_axis is not None else 0
+        if river_axis is None:
+            return {}
+        # chainage of a centerline with disconnected parts runs through them one after the other, which has no flow direction
+        if flow_direction and not network and river_axis.part_count > 1:
+            message = 'Flow direction of a centerline with several disconnected parts is undefined, please treat river as a network'
+            feedback.reportError(QCoreApplication.translate('Distance along river', message))
+            return {}
+        # outlet of river, in coordinates of input layers
+        outlet = None
+        if flow_direction == 2:
+            outlet_point = self.parameterAsPoint(parameters, self.OUTLET, context, input1.crs())
+            outlet = locate_outlet(river_axis, outlet_point.x(), outlet_point.y())
         
-        # get names or full path for 2nd point layer and centerline
-        layer_list2 = [input2, centerline_layer]
-        call_layer_list2 = self.callableLayers(layer_list2, feedback)
-        # projecting points for 2nd point layer
-        message = 'Projecting 2nd input layer on river...'
+        # distances between input points are calculated on ellipsoid, unless planar distances are asked and crs is projected in meters
+        crs = input1.crs()
+        geodesic = not (planar and not crs.isGeographic() and crs.mapUnits() == QgsUnitTypes.DistanceMeters)
+        if planar and geodesic:
+            message = 'Layer coordinate system is not projected in meters, distances will be calculated on ellipsoid'
+            feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
+        
+        # reading and projecting points of both layers at the same time, each layer is read once
+        message = 'Projecting input layers on river...'
         feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
-        layer_projected2 = self.projectPoints(layer_list2, call_layer_list2, projected2, [idfield2], context, feedback)
+        store = ProjectionStore(PROJECTION_STORE_PATH) if incremental else None
+        with profiler.stage('projectPoints') as stage:
+            projections = self.projectLayers([(input1, idfield1), (input2, idfield2)], river_axis, geodesic, store, context, feedback)
+            if projections is not None:
+                stage['features'] = sum(len(ids) for ids, _, _ in projections)
+        if projections is None:
+            return {}
+        (ids1, result1, coords_layer1), (ids2, result2, coords_layer2) = projections
+        # with a flow direction, banks are given relative to flow instead of the direction lines are drawn in
+        if flow:
+            result1 = flow_sides(river_axis, result1, outlet)
+            result2 = flow_sides(river_axis, result2, outlet)
+        
+        # saving projected points
+        with profiler.stage('saveProjectedPoints', len(ids1) + len(ids2)):
+            layer_projected1 = self.saveProjectedPoints(input1, idfield1, ids1, result1, projected1, context)
+            layer_projected2 = self.saveProjectedPoints(input2, idfield2, ids2, result2, projected2, context)
+        if feedback.isCanceled():
+            return {}
+        # points of each layer with coordinates for straight line distances, chainages and closest segments
+        points1 = coords_layer1 + (result1['chainage'], result1['segment'])
+        points2 = coords_layer2 + (result2['chainage'], result2['segment'])
         
         
         # 3/ CALCULATE DISTANCES BETWEEN INPUT POINTS, AND BETWEEN PROJECTED POINTS
         ####################################################################################
         
-        # DISTANCES BETWEEN INPUT POINTS
-        message = 'Getting input layer coordinates...'
-        feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
-        dic_layer1 = self.getCoordinates(input1, idfield1, context)
-        dic_layer2 = self.getCoordinates(input2, idfield2, context)
+        # DISTANCE MATRIX : ALL PAIRS OF POINTS, WRITTEN TO OUTPUT TABLE BLOCK BY BLOCK
+        if matrix:
+            message = 'Calculating distances between all pairs of points...'
+            feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
+            with profiler.stage('writeDistanceMatrix', len(ids1) * len(ids2)):
+                self.writeDistanceMatrix(crs, points1, points2, table_columns, geodesic, river_axis, max_river_distance,
+                                         decimal_count, table_output_path, feedback, flow, outlet)
+            if feedback.isCanceled():
+                return {}
         
-        message = 'Calculating distances between input layers...'
-        feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
-        crs = input1.crs()
-        table_distances = self.calculateDistances(crs, dic_layer1, dic_layer2, id1_colname, id2_colname, dist_colname, context, feedback)
+        # PAIRS OF POINTS WITH SAME ID
+        else:
+            # straight line distances between input points, and distances along river between projected points
+            message = 'Calculating distances between input layers and along river...'
+            feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
+            with profiler.stage('calculateDistances') as stage:
+                df_result = self.calculateDistances(crs, points1, points2, table_columns, geodesic, river_axis, feedback, flow, outlet)
+            if df_result is None or feedback.isCanceled():
+                return {}
+            stage['features'] = len(df_result)
         
-        # DISTANCES BETWEEN PROJECTED POINTS
-        message = 'Getting projected layers coordinates...'
-        feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
-        dic_layer1proj = self.getCoordinates(layer_projected1, idfield1, context)
-        dic_layer2proj = self.getCoordinates(layer_projected2, idfield2, context)
+            # do some treatments on dataframe
+            message = 'Rounding numbers in result dataframe...'
+            feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
+            df_result = self.dfCalculations(df_result, table_columns, decimal_count)
         
-        message = 'Calculating distances between projected layers...'
-        feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
-        crs = layer_projected1.crs()
-        table_projected_distances = self.calculateDistances(crs, dic_layer1proj, dic_layer2proj, id1_colname, id2_colname, riverdist_colname, context, feedback)
+            # Then add dataframe to sink
+            message = 'Saving dataframe to table...'
+            feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
+            with profiler.stage('addFeaturestoTable', len(df_result)):
+                self.addFeaturestoTable(df_result, table_output_path, table_columns)
         
         
-        # 4/ SAVE RESULTS TO OUTPUT TABLE
+        # 4/ LOAD OUTPUT TABLE
         ####################################################################################
         
-        message = 'Saving distances to table...'
-        feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
-       
-        # create one dataframe from the 2 dataframes
-        if table_distances[id1_colname].equals(table_projected_distances[id1_colname]) and table_distances[id2_colname].equals(table_projected_distances[id2_colname]):
-            df_result = table_distances
-            df_result[riverdist_colname] = table_projected_distances[riverdist_colname]
-        else:
-            message = 'Sorry, there was an error while creating result dataframe'
-            feedback.reportError(QCoreApplication.translate('Distance along river', message))
-            return {}
-        
-        # do some treatments on dataframe
-        message = 'Rounding numbers and sorting lines by id in result dataframe...'
-        feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
-        df_result = self.dfCalculations(df_result, id1_colname, 2, dist_colname, riverdist_colname, feedback)
-        
-        # Then add dataframe to sink
-        message = 'Saving dataframe to table...'
-        feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
-        self.addFeaturestoTable(df_result, table_output_path)
-        
         # load distance table in project
-        if table_output_path.startswith('/'): # linux
-            prefix = 'file://'
-        else: # windows
-            prefix = 'file:///'
-        uri = prefix + table_output_path + '?delimiter=,'
-        table_layer = QgsVectorLayer(uri, "Distance table", "delimitedtext")
-        # with QgsProject.instance().addMapLayer layer is added but cannot be seen
-        # see https://gis.stackexchange.com/a/401802/175131
-        context.temporaryLayerStore().addMapLayer(table_layer)
-        context.addLayerToLoadOnCompletion(table_layer.id(), QgsProcessingContext.LayerDetails("", QgsProject.instance(), ""))
+        self.loadTable(table_output_path, context)
+        
+        # save profile of stages
+        feedback.setCurrentStep(len(self.STAGES))
+        if profile_path:
+            profiler.write(profile_path)
         
         
         # 5/ RETURN THE RESULTING TABLE AND LAYERS
@@ -328,14 +493,16 @@ class DistanceAlongRiverAlgorithm(QgsProcessingAlgorithm):
      
         # if centerline layer is created :
         if river.geometryType() == QgsWkbTypes.PolygonGeometry :
-            # don't know why exactly, but centerline layer must be removed so that it can be loaded automatically in qgis
-            QgsProject.instance().removeMapLayer(centerline_layer)
-            return {self.OUTPUT_TABLE: table_output_path, self.PROJECTED1: layer_projected1, self.PROJECTED2: layer_projected2, self.CENTERLINE_OUTPUT: centerline}
+            results = {self.OUTPUT_TABLE: table_output_path, self.PROJECTED1: layer_projected1, self.PROJECTED2: layer_projected2, self.CENTERLINE_OUTPUT: centerline}
         # if no centerline generated :
         else:
             # return distance table and projected points layers
             #return {self.OUTPUT_TABLE: table_output_path, self.PROJECTED1: layer_projected1, self.PROJECTED2: layer_projected2}
-            return {self.OUTPUT_TABLE: table_output_path}
+            results = {self.OUTPUT_TABLE: table_output_path}
+        # profile of stages, if asked
+        if profile_path:
+            results[self.PROFILE] = profile_path
+        return results
  
     
     # FUNCTIONS
@@ -353,144 +520,188 @@ class DistanceAlongRiverAlgorithm(QgsProcessingAlgorithm):
             feedback.reportError(QCoreApplication.translate('Distance along river', message))
             return "problem"
     
-    # create centerline of a polygon with grass voronoi.skeleton algorithm
+    # create centerline of a polygon with grass voronoi.skeleton algorithm, or get it from cache
     def createCenterline(self, polygon, parameters, context, feedback):
-        # voronoi.skeleton parameters
-        skeleton_param = {'input' : polygon,
-                  'smoothness' : 0.1,
-                  'thin' : -1,
-                  'output' : parameters[self.CENTERLINE_OUTPUT]} # to output this layer in QGIS as well
-        # run voronoi.skeleton
-        skeleton_result = processing.run("grass7:v.voronoi.skeleton", skeleton_param, is_child_algorithm=True, context=context, feedback=feedback)
-        # get output
-        centerline_layer = skeleton_result['output']
-        # Check for cancelation
-        if feedback.isCanceled():
-            return {}
-        # return centerline
-        return centerline_layer
+        destination = self.parameterAsOutputLayer(parameters, self.CENTERLINE_OUTPUT, context)
+        method = CENTERLINE_METHODS[self.parameterAsEnum(parameters, self.CENTERLINE_METHOD, context)]
+        return createCenterline(polygon, destination, context, feedback, method)
     
-    # given a line layer, merge all lines into one with dissolve algorithm
-    def mergeLines(self, line, context, feedback):
-        # dissolve parameters
-        dissolve_param = {'INPUT' : line,
-                  'FIELD' : None,
-                  #'OUTPUT' : parameters[self.OUTPUT]} # to output this layer in QGIS as well
-                  'OUTPUT' : 'dissolve'}
-        # run dissolve
-        dissolve_result = processing.run("native:dissolve", dissolve_param, is_child_algorithm=True, context=context, feedback=feedback)
-        dissolve_layer = dissolve_result['OUTPUT']
-        # Check for cancelation
-        if feedback.isCanceled():
-            return {}
-        # return dissolved layer
-        return dissolve_layer
+    # read all lines of centerline layer, merge them and store their vertices in a Centerline object,
+    # or in a RiverNetwork object if river is a network of branches
+    # chainages are in meters on the ellipsoid if crs is geographic, in crs units otherwise
+    def loadCenterline(self, centerline_layer, crs, network, feedback):
+        from .river_engine.api import load_centerline
+        # join lines sharing an end point, so that chainage runs along the whole river
+        parts = mergedLineParts(centerline_layer)
+        if len(parts) > 1 and not network:
+            message = (f'centerline has {len(parts)} disconnected parts, distances along river between points on different parts '
+                       'are left empty, treat river as a network to calculate them through junctions')
+            feedback.pushWarning(QCoreApplication.translate('Distance along river', message))
+        measure = self.centerlineMeasure(crs)
+        try:
+            river_axis = load_centerline(parts, measure, network)
+        except ValueError:
+            message = 'River centerline is empty, cannot project points on it'
+            feedback.reportError(QCoreApplication.translate('Distance along river', message))
+            return None
+        if network:
+            message = f'river network has {river_axis.branch_count} branches and {river_axis.node_count} nodes'
+            feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
+        return river_axis
     
-    # if a layer is loaded, get its name, else gets it source = full path
-    def callableLayers(self, layer_list, feedback):
-        call_layer_list = []
-        for layer in layer_list:
-            # if layer is loaded in QGIS, get its name
-            if len(QgsProject.instance().mapLayersByName(layer.name())) != 0:
-                call_layer_list.append(layer.name())
-            # else, get its full path
+    # function measuring lengths of centerline segments on ellipsoid if crs is geographic, None if planar lengths can be used
+    def centerlineMeasure(self, crs):
+        if not crs.isGeographic():
+            return None
+        from .river_engine.api import ellipsoid_measure
+        # degrees can't be used as distances, measure segments on ellipsoid once for all
+        return ellipsoid_measure(crs.ellipsoidAcronym())
+    
+    # read points of several layers and project them on centerline at the same time, in a pool of threads
+    # layers are read through feature sources created here, as layers themselves can't be used from other threads
+    # returns for each layer point ids, projection result as returned by Centerline.project, and (ids, x array, y array)
+    # of points for straight line distances, geographic if geodesic is True, or None if cancelled
+    # if a projection store is given, points already projected on the same centerline in previous runs are not projected again
+    def projectLayers(self, layers, centerline, geodesic, store, context, feedback):
+        from .river_engine.api import project
+        from .river_engine.profiling import SharedProgress
+        from .river_engine.projection_store import project_incremental
+        transform_context = context.transformContext()
+        # projections of a layer are stored under its source and id field
+        sources = [(QgsVectorLayerFeatureSource(layer), layer.fields(), idfield, layer.crs(), f'{layer.source()}|{idfield}')
+                   for layer, idfield in layers]
+        reused = [0] * len(sources)
+        # progress of projection is the mean progress of all layers
+        progress = SharedProgress(feedback, len(sources))
+        
+        # read and project points of one layer, run in a worker thread
+        def projectLayer(index):
+            feature_source, fields, idfield, crs, layer_key = sources[index]
+            if feedback.isCanceled():
+                return None
+            ids, xs, ys = self.getCoordinates(feature_source, fields, idfield)
+            layer_feedback = progress.task(index)
+            if store is None:
+                result = project(centerline, xs, ys, layer_feedback)
             else:
-                call_layer_list.append(layer.source())
-        return call_layer_list
+                projection = project_incremental(centerline, store, layer_key, ids, xs, ys, layer_feedback)
+                if projection is None:
+                    return None
+                result, reused[index] = projection
+            if result is None:
+                return None
+            if geodesic:
+                return ids, result, (ids,) + self.toGeographic(xs, ys, crs, transform_context)
+            return ids, result, (ids, xs, ys)
+        
+        # spatial index of centerline is built once, before threads share it
+        centerline.prepare()
+        with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+            results = list(executor.map(projectLayer, range(len(sources))))
+        if feedback.isCanceled() or None in results:
+            return None
+        if store is not None:
+            message = f'{sum(reused)} points were already projected on this river in previous runs'
+            feedback.pushInfo(QCoreApplication.translate('Distance along river', message))
+        return results
     
-    def projectPoints(self, layer_list, call_layer_list, projected, field_list, context, feedback):
-        # SQL query to get endpoints of shortest lines between points and river centerline
-        query = f"""SELECT st_endpoint(ST_ShortestLine(p.geometry, l.geometry)) as geometry,
-                    p.{field_list[0]},
-                    ROUND(ST_Length(ST_ShortestLine(p.geometry, l.geometry)), 6) AS distance
-                    FROM "{call_layer_list[0]}" AS p, "{call_layer_list[1]}" AS l"""
-        # run this query to create 1st projected point layer
-        layer_projected = self.runSqlQuery(layer_list, field_list, query, 0, projected, context, feedback)
-        layer_projected = QgsProcessingUtils.mapLayerFromString(layer_projected, context)
-        return layer_projected
+    # save projected points of a layer in projected layer with their id, distance to centerline and chainage,
+    # index of closest centerline segment, side of centerline (1 : left, -1 : right, 0 : on centerline) and signed offset
+    # returns projected layer
+    def saveProjectedPoints(self, layer, idfield, ids, result, projected, context):
+        # create projected layer, with same id field as input layer
+        fields = QgsFields()
+        fields.append(layer.fields().field(idfield))
+        fields.append(QgsField('distance', QVariant.Double))
+        fields.append(QgsField('chainage', QVariant.Double))
+        fields.append(QgsField('segment', QVariant.Int))
+        fields.append(QgsField('side', QVariant.Int))
+        fields.append(QgsField('offset', QVariant.Double))
+        if not projected:
+            projected = 'memory:'
+        sink, dest_id = QgsProcessingUtils.createFeatureSink(projected, context, fields, QgsWkbTypes.Point, layer.crs())
+        for i, pnt_id in enumerate(ids):
+            feature = QgsFeature(fields)
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(result['x'][i], result['y'][i])))
+            feature.setAttributes([pnt_id, round(float(result['distance'][i]), 6), round(float(result['chainage'][i]), 6),
+                                   int(result['segment'][i]), int(result['side'][i]), round(float(result['offset'][i]), 6)])
+            sink.addFeature(feature, QgsFeatureSink.FastInsert)
+        # deleting sink flushes features to disk
+        del sink
+        return QgsProcessingUtils.mapLayerFromString(dest_id, context)
     
-    # run a sql query given a query, list of layers and list of field, layers must be names or sources (full paths)
-    # geom_type : geometry type for resulting layer, 0 for autodetect, 1 for no geometry (cf. alghelp for more)
-    def runSqlQuery(self, layer_list, field_list, query, geom_type, output, context, feedback):
-        # executesql parameters
-        executesql_param = {'INPUT_DATASOURCES' : layer_list,
-                            'INPUT_QUERY' : query,
-                            'INPUT_GEOMETRY_TYPE' : geom_type,
-                            'OUTPUT' : output} # i.e. parameters[self.PROJECTED1] to output this layer in QGIS, else just a string
-        # run executesql algorithm
-        result = processing.run("qgis:executesql", executesql_param, is_child_algorithm=True, context=context, feedback=feedback)
-        layer = result['OUTPUT']
-        # Check for cancelation
-        if feedback.isCanceled():
-            return {}
-        # return result layer
-        return layer
+    # from a layer or a feature source of a layer, get point ids as a list and point coordinates as x and y arrays, in a single pass
+    def getCoordinates(self, source, fields, idfield):
+        import numpy as np
+        # only id attribute and geometry are fetched
+        request = QgsFeatureRequest().setSubsetOfAttributes([idfield], fields)
+        ids, xs, ys = [], [], []
+        for f in source.getFeatures(request):
+            if not f.hasGeometry():
+                continue
+            geom = f.geometry()
+            pt = geom.asMultiPoint()[0] if geom.isMultipart() else geom.asPoint()
+            # NULL ids are QVariants, which can't be compared with other ids
+            ids.append(f[idfield] if f[idfield] != NULL else None)
+            xs.append(pt.x())
+            ys.append(pt.y())
+        return ids, np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
     
-    # from one layer, create a dictionary with id values as keys and qgspoints as values
-    # if layer crs is projected, convert coordinates to geographic ones
-    def getCoordinates(self, layer, idfield, context):
-        # initiates result dictionary
-        dic_layer = {}
-        # iterates over features
-        for f in layer.getFeatures():
-            dic_layer[f[idfield]] = QgsPointXY(f.geometry().asPoint()[0], f.geometry().asPoint()[1])
-        # get layer crs
-        crs = layer.crs()
-        # if crs is projected
-        if layer.crs().isGeographic() == False:
-            # transform projected coordinates in geographic coordinates
-            transformContext = QgsProject.instance().transformContext()
-            geog_crs = QgsCoordinateReferenceSystem(crs.geographicCrsAuthId())
-            xform = QgsCoordinateTransform(crs, geog_crs, transformContext)
-            for key, value in dic_layer.items():
-                dic_layer[key] = xform.transform(dic_layer[key])
-        return dic_layer
+    # if crs is projected, convert coordinates to geographic ones
+    def toGeographic(self, xs, ys, crs, transform_context):
+        import numpy as np
+        if crs.isGeographic() or len(xs) == 0:
+            return xs, ys
+        # transform all projected coordinates in geographic coordinates at once,
+        # by storing them as the vertices of a single line
+        geog_crs = QgsCoordinateReferenceSystem(crs.geographicCrsAuthId())
+        xform = QgsCoordinateTransform(crs, geog_crs, transform_context)
+        vertices = QgsLineString(list(xs), list(ys))
+        vertices.transform(xform)
+        return np.asarray(vertices.xVector(), dtype=float), np.asarray(vertices.yVector(), dtype=float)
     
-    # calculate distances between pair of points in 2 layers with same id using pyproj
-    def calculateDistances(self, crs, dic_layer1, dic_layer2, id1_colname, id2_colname, dist_colname, context, feedback):
-        # uses QgsDistanceArea to calculate ellipsoid based distances
-        d = QgsDistanceArea()
-        d.setEllipsoid(crs.ellipsoidAcronym())
-        # get all keys from both dictionaries, no duplicates
-        id_set = set(list(dic_layer1.keys()) + list(dic_layer2.keys()))
-        # create empty result dictionary
-        dic_result = {id1_colname : [], id2_colname : [], dist_colname : []}
-        # for each key
-        for pnt_id in id_set:
-            # if point is present in both layers
-            if pnt_id in dic_layer1.keys() and pnt_id in dic_layer2.keys():
-                # calculate distance between points with same id
-                #pt1 = QgsPointXY(dic_layer1[pnt_id][0], dic_layer1[pnt_id][1])
-                #pt2 = QgsPointXY(dic_layer2[pnt_id][0], dic_layer1[pnt_id][1])
-                distance = d.measureLine(dic_layer1[pnt_id], dic_layer2[pnt_id])
-                # fills result dictionary
-                dic_result[id1_colname].append(pnt_id)
-                dic_result[id2_colname].append(pnt_id)
-                dic_result[dist_colname].append(distance)
-            # if point is present only in one layer
-            else:
-                # fills result dictionary
-                dic_result[dist_colname].append(NULL)
-                if pnt_id in dic_layer1.keys():
-                    dic_result[id1_colname].append(pnt_id)
-                    dic_result[id2_colname].append(NULL)
-                else:
-                    dic_result[id1_colname].append(NULL)
-                    dic_result[id2_colname].append(pnt_id)
-        # convert dictionary to pandas dataframe
-        df_result = pd.DataFrame.from_dict(dic_result)
-        # finished
-        return df_result
-            
+    # semi-major axis and flattening of crs ellipsoid, for straight line distances on ellipsoid
+    def ellipsoid(self, crs):
+        from .river_engine.api import ellipsoid_parameters
+        return ellipsoid_parameters(crs.ellipsoidAcronym())
+    
+    # calculate straight line distances and distances along river between pairs of points in 2 layers with same id, all pairs at once
+    # points1 and points2 are (ids, x array, y array, chainage array, segment array) tuples,
+    # coordinates being geographic if geodesic is True
+    # river distances are shortest paths if river is a network, returns a dataframe with columns names, None if cancelled
+    # if flow is True, river distances are signed by flow direction towards outlet and rows sorted from upstream to downstream
+    def calculateDistances(self, crs, points1, points2, columns, geodesic, river_axis, feedback, flow=False, outlet=None):
+        from .river_engine.api import pair_distances
+        return pair_distances(points1, points2, river_axis, geodesic, self.ellipsoid(crs), [name for name, _ in columns], feedback,
+                              flow, outlet)
+    
+    # write distances between all pairs of points of both layers to output table, block by block so that
+    # the whole matrix is never in memory, pairs further than max_river_distance along river are left out if it is not 0
+    # columns : (name, type) of id1, id2, straight line distance and river distance columns
+    # if flow is True, river distances are signed and rows sorted as in calculateDistances
+    def writeDistanceMatrix(self, crs, points1, points2, columns, geodesic,
+                            river_axis, max_river_distance, decimal_count, output_path, feedback, flow=False, outlet=None):
+        from .river_engine.api import distance_matrix
+        from .river_engine.tables import TableWriter
+        blocks = distance_matrix(points1, points2, river_axis, geodesic, self.ellipsoid(crs),
+                                 max_river_distance if max_river_distance > 0 else None, [name for name, _ in columns],
+                                 flow, outlet)
+        with TableWriter(output_path, columns) as writer:
+            for progress, df in blocks:
+                if feedback.isCanceled():
+                    return
+                writer.write(self.dfCalculations(df, columns, decimal_count))
+                if progress is not None:
+                    feedback.setProgress(100 * progress)
     
     # do some calculations on distances dataframe (round distances...)
-    def dfCalculations(self, df, id1_colname, decimal_count, dist_colname, riverdist_colname, feedback):
+    def dfCalculations(self, df, columns, decimal_count):
+        from .river_engine.tables import REAL
         # 1/ round distances
         ###########################################
-        # round column with straight line distances
-        df[dist_colname] = df[dist_colname].apply(lambda x:round(float(x), decimal_count) if x != NULL else NULL)
-        # round column with distances along river axis
-        df[riverdist_colname] = df[riverdist_colname].apply(lambda x:round(float(x), decimal_count) if x != NULL else NULL)
+        # round columns with straight line distances and distances along river axis, NaN stays NaN
+        distance_colnames = [name for name, kind in columns if kind == REAL]
+        df[distance_colnames] = df[distance_colnames].round(decimal_count)
         
         # 2/ sort lines by point id
         ###########################################
@@ -499,9 +710,31 @@ class DistanceAlongRiverAlgorithm(QgsProcessingAlgorithm):
         return df
     
             
-    # given a dataframe and the output table, write dataframe to table       
-    def addFeaturestoTable(self, df, output_path):
-        df.to_csv(output_path, index=False)  
+    # load distance table in project once algorithm has finished
+    def loadTable(self, table_output_path, context):
+        from .river_engine.tables import table_format
+        if table_format(table_output_path) == 'csv':
+            if table_output_path.startswith('/'): # linux
+                prefix = 'file://'
+            else: # windows
+                prefix = 'file:///'
+            uri = prefix + table_output_path + '?delimiter=,'
+            table_layer = QgsVectorLayer(uri, "Distance table", "delimitedtext")
+        elif table_format(table_output_path) == 'gpkg':
+            table_layer = QgsVectorLayer(table_output_path + '|layername=distances', "Distance table", "ogr")
+        else:
+            table_layer = QgsVectorLayer(table_output_path, "Distance table", "ogr")
+        # with QgsProject.instance().addMapLayer layer is added but cannot be seen
+        # see https://gis.stackexchange.com/a/401802/175131
+        context.temporaryLayerStore().addMapLayer(table_layer)
+        context.addLayerToLoadOnCompletion(table_layer.id(), QgsProcessingContext.LayerDetails("", context.project(), ""))
+    
+    # given a dataframe and the output table, write dataframe to table chunk by chunk
+    # format of table (CSV, GeoPackage or Parquet) is given by output path extension
+    def addFeaturestoTable(self, df, output_path, columns):
+        from .river_engine.tables import TableWriter
+        with TableWriter(output_path, columns) as writer:
+            writer.write_all(df)
 
     def name(self):
         """
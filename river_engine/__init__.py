@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ In-process engines used by the River Tools processing algorithms.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ Headless API of River Tools : merge, centerline, project, chainage and
+ segment functions working on geometries and arrays, without the Processing
+ framework nor the QGIS project. The processing algorithms are thin wrappers
+ over these functions, batch scripts can call them directly.
+ Only functions working on geometries import qgis, when they are called.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import numpy as np
+import pandas as pd
+
+from .distances import planar_distance, vincenty_distance
+from .linear_referencing import Centerline, chainage_distance_matrix, signed_distance
+from .network import RiverNetwork
+
+# columns of distance tables : ids of both points, straight line distance and distance along river
+DISTANCE_COLUMNS = ['ID1', 'ID2', 'straight_dist', 'river_dist']
+
+# segmentation methods, in the order of the segmentation boxes algorithm enum parameter
+SEGMENTATION_METHODS = ['voronoi', 'transect']
+
+
+# merge line geometries, joining lines sharing an end point
+# returns a list of parts, each part being a list of (x, y) vertices
+def merge_lines(geometries):
+    from qgis.core import QgsGeometry
+    if not geometries:
+        return []
+    merged = QgsGeometry.collectGeometry(geometries).mergeLines()
+    if merged.isMultipart():
+        parts = merged.asMultiPolyline()
+    else:
+        parts = [merged.asPolyline()]
+    return [[(pt.x(), pt.y()) for pt in part] for part in parts if part]
+
+
+# centerline of river polygon geometries, from the Voronoi diagram of their boundary
+# returns a list of parts as merge_lines, empty if polygons are too small to have a centerline
+def polygon_centerline(polygons, spacing=None, min_spur_length=None, feedback=None):
+    from qgis.core import QgsGeometry
+    from .centerline import medial_axis
+    axis = medial_axis(QgsGeometry.unaryUnion(polygons), spacing, min_spur_length, feedback)
+    if axis.isEmpty():
+        return []
+    return merge_lines([axis])
+
+
+# function measuring lengths of segments on an ellipsoid, used for centerlines in geographic coordinates
+def ellipsoid_measure(ellipsoid):
+    from qgis.core import QgsDistanceArea, QgsPointXY
+    d = QgsDistanceArea()
+    d.setEllipsoid(ellipsoid)
+    def measure(x0, y0, x1, y1):
+        return [d.measureLine(QgsPointXY(x0[i], y0[i]), QgsPointXY(x1[i], y1[i])) for i in range(len(x0))]
+    return measure
+
+
+# semi-major axis and flattening of an ellipsoid given by its acronym, None if it is unknown
+def ellipsoid_parameters(ellipsoid):
+    from qgis.core import QgsDistanceArea
+    d = QgsDistanceArea()
+    d.setEllipsoid(ellipsoid)
+    if not d.willUseEllipsoid():
+        return None
+    return d.ellipsoidSemiMajor(), 1 / d.ellipsoidInverseFlattening()
+
+
+# centerline from its parts, as a RiverNetwork if river is a network of branches
+# measure : function measuring segment lengths, as returned by ellipsoid_measure, planar lengths are used if None
+# raises ValueError if there are no parts
+def load_centerline(parts, measure=None, network=False):
+    if network:
+        return RiverNetwork(parts, measure)
+    return Centerline(parts, measure)
+
+
+# project points on centerline, returns Centerline.project result, None if cancelled
+def project(centerline, xs, ys, feedback=None):
+    return centerline.project(xs, ys, feedback)
+
+
+# river outlet given its coordinates, used to orient distances by flow direction
+def locate_outlet(centerline, x, y):
+    return centerline.locate_outlet(x, y)
+
+
+# projection result as returned by project, with side and offset relative to flow direction instead of digitizing
+# direction of centerline, left bank being on the left of flow : outlet as returned by locate_outlet, or None if
+# centerline is drawn downstream
+def flow_sides(centerline, result, outlet=None):
+    sign = centerline.flow_sign(result['chainage'], outlet, result['segment'])
+    return dict(result, side=result['side'] * sign, offset=result['offset'] * sign)
+
+
+# along-river distances between pairs of chainages, shortest paths if centerline is a network
+# segment1, segment2 : closest segments of points, as returned by project, needed to place points on network branches
+# and on parts of a centerline
+# NaN if a chainage is NaN or if points are on unconnected branches or parts, None if cancelled
+def river_distances(centerline, chainage1, chainage2, feedback=None, segment1=None, segment2=None):
+    return centerline.distance(chainage1, chainage2, feedback, segment1, segment2)
+
+
+# straight line distances between pairs of points, planar, or on ellipsoid if geodesic is True
+# coordinates are then geographic, ellipsoid is a (semi-major axis, flattening) tuple, WGS84 if None
+def straight_distances(x1, y1, x2, y2, geodesic=False, ellipsoid=None):
+    if not geodesic:
+        return planar_distance(x1, y1, x2, y2)
+    if ellipsoid is None:
+        return vincenty_distance(x1, y1, x2, y2)
+    return vincenty_distance(x1, y1, x2, y2, *ellipsoid)
+
+
+# points of a set as a dataframe, if unique is True the last point is kept if an id is duplicated,
+# points without id (None) are all kept
+# points : (ids, x array, y array, chainage array, segment array), coordinates being those used for straight line
+# distances, chainages and segments as returned by project
+def _points_frame(points, unique=True):
+    ids, xs, ys, chainages, segments = points
+    df = pd.DataFrame({'id': pd.Series(ids, dtype=object), 'x': xs, 'y': ys, 'chainage': chainages,
+                       'segment': np.asarray(segments, dtype=float)})
+    if unique:
+        df = df[df['id'].isna() | ~df['id'].duplicated(keep='last')]
+    return df
+
+
+# points of a set without id, as rows of the merge of both sets where they are only in this set
+def _unpaired(df, suffix, side):
+    df = df.rename(columns={name: name + suffix for name in df.columns if name != 'id'})
+    return df.assign(_merge=side)
+
+
+# distances between points of 2 sets with the same id, points being given as in _points_frame
+# returns a dataframe with given columns, an id is None when its point is only in one set or has no id,
+# distances are then NaN
+# if flow is True, distances along river are signed by flow direction (positive if 2nd point is downstream of 1st one)
+# and rows are sorted from upstream to downstream 1st point, outlet being given by locate_outlet, or None if
+# centerline is drawn downstream
+# None if cancelled
+def pair_distances(points1, points2, centerline, geodesic=False, ellipsoid=None, columns=DISTANCE_COLUMNS, feedback=None,
+                   flow=False, outlet=None):
+    id1_colname, id2_colname, dist_colname, riverdist_colname = columns
+    df1, df2 = _points_frame(points1), _points_frame(points2)
+    # points without id are not paired with each other, each one gets a row of its own
+    # ids are not sorted, they can be of types that can't be compared
+    null1, null2 = df1['id'].isna(), df2['id'].isna()
+    df = pd.merge(df1[~null1], df2[~null2], on='id', how='outer', suffixes=('1', '2'), indicator=True, sort=False)
+    if null1.any() or null2.any():
+        unpaired = [_unpaired(df1[null1], '1', 'left_only'), _unpaired(df2[null2], '2', 'right_only')]
+        df = pd.concat([df.astype({'_merge': object})] + [frame for frame in unpaired if len(frame)], ignore_index=True)
+    chainage1, chainage2 = df['chainage1'].to_numpy(), df['chainage2'].to_numpy()
+    segment1, segment2 = df['segment1'].to_numpy(), df['segment2'].to_numpy()
+    distances = river_distances(centerline, chainage1, chainage2, feedback, segment1, segment2)
+    if distances is None:
+        return None
+    order = None
+    if flow:
+        position1 = centerline.flow_position(chainage1, outlet, segment1)
+        position2 = centerline.flow_position(chainage2, outlet, segment2)
+        distances = signed_distance(distances, position1, position2)
+        # stable sort of positions, points without position come last
+        order = np.argsort(position1, kind='stable')
+    result = pd.DataFrame({id1_colname: df['id'].where(df['_merge'] != 'right_only', None),
+                           id2_colname: df['id'].where(df['_merge'] != 'left_only', None),
+                           dist_colname: np.asarray(straight_distances(df['x1'].to_numpy(), df['y1'].to_numpy(),
+                                                                       df['x2'].to_numpy(), df['y2'].to_numpy(),
+                                                                       geodesic, ellipsoid), dtype=np.float64),
+                           riverdist_colname: np.asarray(distances, dtype=np.float64)})
+    if order is not None:
+        result = result.iloc[order].reset_index(drop=True)
+    return result
+
+
+# distances between all pairs of points of 2 sets, points being given as in _points_frame
+# all points are kept, rows of points with the same or a NULL id included
+# the matrix is calculated block by block, so that it is never in memory as a whole
+# pairs further than max_river_distance along river are left out if it is given
+# if flow is True, distances are signed and rows sorted by flow direction as in pair_distances : points of 1st set
+# are sorted once, before the matrix is calculated
+# yields (progress, dataframe) for each block, progress being the fraction of points of 1st set done
+def distance_matrix(points1, points2, centerline, geodesic=False, ellipsoid=None, max_river_distance=None,
+                    columns=DISTANCE_COLUMNS, flow=False, outlet=None):
+    id1_colname, id2_colname, dist_colname, riverdist_colname = columns
+    df1, df2 = _points_frame(points1, unique=False), _points_frame(points2, unique=False)
+    if flow:
+        position1 = centerline.flow_position(df1['chainage'].to_numpy(), outlet, df1['segment'].to_numpy())
+        position2 = centerline.flow_position(df2['chainage'].to_numpy(), outlet, df2['segment'].to_numpy())
+        order = np.argsort(position1, kind='stable')
+        df1, position1 = df1.iloc[order], position1[order]
+    ids1, ids2 = df1['id'].to_numpy(), df2['id'].to_numpy()
+    x1, y1 = df1['x'].to_numpy(), df1['y'].to_numpy()
+    x2, y2 = df2['x'].to_numpy(), df2['y'].to_numpy()
+    chainage1, chainage2 = df1['chainage'].to_numpy(), df2['chainage'].to_numpy()
+    segment1, segment2 = df1['segment'].to_numpy(), df2['segment'].to_numpy()
+    distance = None
+    if isinstance(centerline, RiverNetwork):
+        def distance(rows, cols):
+            return centerline.distance(chainage1[rows], chainage2[cols], None, segment1[rows], segment2[cols])
+    # distances between points on different parts of a centerline are NaN, pairs are left out with max_river_distance
+    multipart = distance is None and centerline.part_count > 1
+    if multipart:
+        part1, part2 = centerline.part_of(segment1), centerline.part_of(segment2)
+    for rows, cols, distances in chainage_distance_matrix(chainage1, chainage2, max_river_distance, distance):
+        if multipart:
+            same = part1[rows] == part2[cols]
+            if max_river_distance is None:
+                distances = np.where(same, distances, np.nan)
+            else:
+                rows, cols, distances = rows[same], cols[same], distances[same]
+        if flow:
+            distances = signed_distance(distances, position1[rows], position2[cols])
+        df = pd.DataFrame({id1_colname: ids1[rows],
+                           id2_colname: ids2[cols],
+                           dist_colname: straight_distances(x1[rows], y1[rows], x2[cols], y2[cols], geodesic, ellipsoid),
+                           riverdist_colname: distances})
+        yield (rows[-1] + 1) / len(ids1) if len(rows) else None, df
+
+
+# segmentation boxes of a river, as (chainage, angle, geometry) tuples
+# polygons : river polygon geometries, if empty a buffer of width around centerline parts is segmented
+# method : one of SEGMENTATION_METHODS, Voronoi polygons of points along centerline or transects perpendicular to it
+# chunk_length : Voronoi boxes are calculated window by window along centerline if it is not 0
+def segment(polygons, parts, length, width, method='voronoi', chunk_length=0, feedback=None):
+    from .boxes import river_mask, transect_boxes, voronoi_boxes
+    mask = river_mask(polygons, parts, width)
+    if method == 'transect':
+        return transect_boxes(mask, parts, length, feedback)
+    return voronoi_boxes(mask, parts, length, chunk_length, feedback)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ Segmentation boxes as geometries, from a river mask and its centerline.
+ Boxes are returned as (distance, angle, geometry) tuples, distance being
+ the chainage of box middle along centerline and angle the centerline
+ azimuth there, as in QGIS points along lines algorithm.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import math
+
+import numpy as np
+from qgis.core import QgsGeometry, QgsPointXY, QgsRectangle, QgsWkbTypes
+
+from .linear_referencing import Centerline
+from .segmentation import box_rings, chainage_windows, line_piece
+
+def _line(part):
+    return QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for x, y in part])
+
+
+def _prepared(mask):
+    engine = QgsGeometry.createGeometryEngine(mask.constGet())
+    engine.prepareGeometry()
+    return engine
+
+
+# polygons part of a clipped geometry, None if there are none
+def _polygons(geometry):
+    geometry = geometry.convertToType(QgsWkbTypes.PolygonGeometry, True)
+    if geometry is None or geometry.isEmpty():
+        return None
+    return geometry
+
+
+# river polygon as a single geometry, or buffer of given width around centerline parts if there is no polygon
+def river_mask(polygons, parts, width):
+    if polygons:
+        return QgsGeometry.unaryUnion(polygons)
+    return QgsGeometry.collectGeometry([_line(part) for part in parts]).buffer(width, 5)
+
+
+# largest distance from river banks to centerline, with a margin
+def _half_width(mask, parts):
+    bank_x, bank_y = zip(*[(v.x(), v.y()) for v in mask.vertices()])
+    return float(Centerline(parts).project(bank_x, bank_y)['distance'].max()) * 1.1
+
+
+# boxes cut by transects perpendicular to centerline every length
+def transect_boxes(mask, parts, length, feedback=None):
+    # transects must cross the whole river
+    half_width = _half_width(mask, parts)
+    engine = _prepared(mask)
+    boxes = []
+    # chainage of each part starts where previous part ended
+    offset = 0.
+    for part in parts:
+        total = _line(part).length()
+        for ring, chainage, angle in box_rings(part, length, half_width):
+            if feedback is not None and feedback.isCanceled():
+                return []
+            ribbon = QgsGeometry.fromPolygonXY([[QgsPointXY(x, y) for x, y in ring]])
+            # transects can cross each other in tight bends
+            if not ribbon.isGeosValid():
+                ribbon = ribbon.makeValid()
+            box = _polygons(QgsGeometry(engine.intersection(ribbon.constGet())))
+            if box is None:
+                continue
+            # ribbons are as wide as the widest part of river, and can reach neighbouring loops of a meander :
+            # only parts of box touching centerline between both transects are kept
+            start = (chainage // length) * length
+            piece = _line(line_piece(part, start, min(start + length, total)))
+            kept = [polygon for polygon in box.asGeometryCollection() if polygon.intersects(piece)]
+            if kept:
+                boxes.append((offset + chainage, angle, QgsGeometry.collectGeometry(kept)))
+        offset += total
+    return boxes
+
+
+# same boxes as points along lines + Voronoi polygons + clip, calculated window by window along centerline
+# so that memory does not grow with river length, chunk_length = 0 processes the whole centerline at once
+# chainages of all parts follow each other, and Voronoi polygons of all parts are calculated together
+def voronoi_boxes(mask, parts, length, chunk_length=0, feedback=None):
+    engine = _prepared(mask)
+    # points, as created by points along lines, with their part and chainage along their part
+    lines = [_line(part) for part in parts]
+    site_part, site_chainage, site_distance = [], [], []
+    offset = 0.
+    for index, line in enumerate(lines):
+        middles = np.arange(length / 2, line.length(), length)
+        site_part.append(np.full(len(middles), index))
+        site_chainage.append(middles)
+        site_distance.append(offset + middles)
+        offset += line.length()
+    site_part = np.concatenate(site_part)
+    site_chainage = np.concatenate(site_chainage)
+    site_distance = np.concatenate(site_distance)
+    points = [lines[part].interpolate(chainage).asPoint() for part, chainage in zip(site_part, site_chainage)]
+    px = np.array([pt.x() for pt in points])
+    py = np.array([pt.y() for pt in points])
+    # any river point is less than reach from its closest point : its closest centerline point is less than
+    # half_width away, and the closest point of this centerline point less than a box length away, points being
+    # half a box length apart from each other but up to a box length from the downstream end of a part
+    reach = _half_width(mask, parts) + length
+    # only points less than reach from river can have a box, e.g. when river is a part of a longer one
+    extent = mask.boundingBox()
+    owner = ((px >= extent.xMinimum() - reach) & (px <= extent.xMaximum() + reach)
+             & (py >= extent.yMinimum() - reach) & (py <= extent.yMaximum() + reach))
+    boxes = []
+    for start, end in chainage_windows(offset, length, chunk_length if chunk_length > 0 else offset):
+        if feedback is not None and feedback.isCanceled():
+            return []
+        window = np.nonzero(owner & (site_distance >= start) & (site_distance < end))[0]
+        if len(window) == 0:
+            continue
+        # river points of window boxes are less than reach from window points, and the points they are closest to
+        # less than twice reach : Voronoi polygons of points in this area, from any part, are the same as
+        # without windows, once clipped by the area of window boxes
+        xmin, xmax = px[window].min(), px[window].max()
+        ymin, ymax = py[window].min(), py[window].max()
+        local = QgsGeometry.fromRect(QgsRectangle(xmin - reach, ymin - reach, xmax + reach, ymax + reach))
+        near = np.nonzero((px >= xmin - 2 * reach) & (px <= xmax + 2 * reach)
+                          & (py >= ymin - 2 * reach) & (py <= ymax + 2 * reach))[0]
+        if len(near) == 1:
+            cells = [local]
+        else:
+            sites = QgsGeometry.fromMultiPointXY([points[i] for i in near])
+            cells = sites.voronoiDiagram(local).asGeometryCollection()
+        window_boxes = []
+        for cell in cells:
+            # find the point this cell belongs to, among points inside cell bounding box
+            bbox = cell.boundingBox()
+            candidates = near[(px[near] >= bbox.xMinimum()) & (px[near] <= bbox.xMaximum())
+                              & (py[near] >= bbox.yMinimum()) & (py[near] <= bbox.yMaximum())]
+            site = next((i for i in candidates if cell.contains(points[i])), None)
+            # only boxes of this window are kept, others belong to neighbouring windows
+            if site is None or not start <= site_distance[site] < end:
+                continue
+            cell = cell.intersection(local)
+            box = _polygons(QgsGeometry(engine.intersection(cell.constGet())))
+            if box is not None:
+                angle = math.degrees(lines[site_part[site]].interpolateAngle(float(site_chainage[site])))
+                window_boxes.append((float(site_distance[site]), angle, box))
+        # boxes are kept in order along centerline, so that numbering is the same as without windows
+        boxes.extend(sorted(window_boxes, key=lambda b: b[0]))
+    return boxes
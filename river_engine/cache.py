@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ On-disk cache of files named after a hash of their inputs.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import hashlib
+import os
+import shutil
+
+# default maximum size of a cache directory, in bytes
+DEFAULT_MAX_SIZE = 500 * 1024 * 1024
+
+
+class FileCache:
+    """
+    Directory of files named after a content key.
+
+    Least recently used files are removed when the total size of the
+    directory goes above max_size.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE, suffix='.gpkg'):
+        self.directory = directory
+        self.max_size = max_size
+        self.suffix = suffix
+
+    # build a key from any number of parts, bytes are hashed as is, other parts with their repr
+    @staticmethod
+    def key(*parts):
+        sha = hashlib.sha256()
+        for part in parts:
+            if not isinstance(part, (bytes, bytearray)):
+                part = repr(part).encode('utf-8')
+            sha.update(part)
+            # separator, so that ('ab', 'c') and ('a', 'bc') give different keys
+            sha.update(b'\0')
+        return sha.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    # return path of cached file, or None if key is not in cache
+    def get(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        # mark file as recently used
+        os.utime(path)
+        return path
+
+    # move source file into cache under given key, returns its new path
+    def put(self, key, source):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        shutil.move(source, path)
+        self.evict(keep=key)
+        return path
+
+    # remove least recently used files until cache size is below max_size
+    def evict(self, keep=None):
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            if keep is not None and path == self.path(keep):
+                continue
+            os.remove(path)
+            total -= size
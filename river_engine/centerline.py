@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ Centerline of a river polygon, from the Voronoi diagram of its densified
+ boundary (medial axis), without GRASS.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import math
+
+from qgis.core import QgsGeometry, QgsPointXY
+
+
+# mean width of a long polygon, estimated from its area and perimeter
+def mean_width(polygon):
+    perimeter = polygon.constGet().perimeter()
+    if perimeter == 0:
+        return 0.
+    return 2 * polygon.area() / perimeter
+
+
+# remove spurs from a network of segments : branches going from a dead end to a junction,
+# shorter than min_length, are removed until there are none left
+# segments : list of ((x0, y0), (x1, y1)), returns remaining segments
+def prune_spurs(segments, min_length):
+    # adjacency between nodes, a node being a coordinate tuple
+    neighbours = {}
+    for a, b in segments:
+        if a == b:
+            continue
+        neighbours.setdefault(a, set()).add(b)
+        neighbours.setdefault(b, set()).add(a)
+    changed = True
+    while changed:
+        changed = False
+        for leaf in [node for node, nodes in neighbours.items() if len(nodes) == 1]:
+            # leaf may have been removed with a previous spur
+            if leaf not in neighbours or len(neighbours[leaf]) != 1:
+                continue
+            # walk from dead end until a junction or another dead end
+            branch = [leaf]
+            length = 0.
+            previous, node = None, leaf
+            while True:
+                following = [n for n in neighbours[node] if n != previous]
+                if len(neighbours[node]) > 2 or not following or (node != leaf and len(neighbours[node]) == 1):
+                    break
+                previous, node = node, following[0]
+                length += math.dist(previous, node)
+                branch.append(node)
+            # only spurs attached to a junction are removed, the main axis ends are kept
+            if len(neighbours[node]) > 2 and length < min_length:
+                for n1, n2 in zip(branch[:-1], branch[1:]):
+                    neighbours[n1].discard(n2)
+                    neighbours[n2].discard(n1)
+                for n in branch[:-1]:
+                    del neighbours[n]
+                changed = True
+    return [(a, b) for a, nodes in neighbours.items() for b in nodes if a < b]
+
+
+# centerline of a polygon geometry, as a (multi)line geometry
+# spacing : distance between boundary vertices used for Voronoi diagram, defaults to a quarter of mean width
+# min_spur_length : spurs shorter than this are removed, defaults to mean width
+def medial_axis(polygon, spacing=None, min_spur_length=None, feedback=None):
+    width = mean_width(polygon)
+    if spacing is None:
+        spacing = width / 4
+    if min_spur_length is None:
+        min_spur_length = width
+    # vertices of densified boundary are the sites of Voronoi diagram
+    densified = polygon.densifyByDistance(spacing) if spacing > 0 else polygon
+    sites = QgsGeometry.fromMultiPointXY([QgsPointXY(v) for v in densified.vertices()])
+    edges = sites.voronoiDiagram(QgsGeometry(), 0, True)
+    if feedback is not None and feedback.isCanceled():
+        return QgsGeometry()
+    # keep Voronoi edges lying inside polygon, they approximate its medial axis
+    engine = QgsGeometry.createGeometryEngine(polygon.constGet())
+    engine.prepareGeometry()
+    segments = []
+    for edge in edges.constParts():
+        if engine.contains(edge):
+            points = [(v.x(), v.y()) for v in edge.vertices()]
+            segments.extend(zip(points[:-1], points[1:]))
+    segments = prune_spurs(segments, min_spur_length)
+    lines = [QgsGeometry.fromPolylineXY([QgsPointXY(*a), QgsPointXY(*b)]) for a, b in segments]
+    if not lines:
+        return QgsGeometry()
+    return QgsGeometry.collectGeometry(lines).mergeLines()
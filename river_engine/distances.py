@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ Straight line distances between many pairs of points at once.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import numpy as np
+
+# WGS84 ellipsoid, used when no other ellipsoid is given
+WGS84_SEMI_MAJOR = 6378137.0
+WGS84_FLATTENING = 1 / 298.257223563
+
+
+# planar distances between arrays of points (x1, y1) and (x2, y2)
+def planar_distance(x1, y1, x2, y2):
+    return np.hypot(np.asarray(x2, dtype=float) - np.asarray(x1, dtype=float),
+                    np.asarray(y2, dtype=float) - np.asarray(y1, dtype=float))
+
+
+# geodesic distances in meters between arrays of points given in degrees, with Vincenty inverse formula
+# a : semi major axis of ellipsoid, f : flattening of ellipsoid
+# NaN coordinates give NaN distances
+def vincenty_distance(lon1, lat1, lon2, lat2, a=WGS84_SEMI_MAJOR, f=WGS84_FLATTENING,
+                      tolerance=1e-12, max_iterations=200):
+    b = (1 - f) * a
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=float)) for v in (lon1, lat1, lon2, lat2))
+    L = lon2 - lon1
+    # reduced latitudes
+    U1 = np.arctan((1 - f) * np.tan(lat1))
+    U2 = np.arctan((1 - f) * np.tan(lat2))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+    lam = L
+    # iterate until change in lambda is negligible for all pairs
+    for _ in range(max_iterations):
+        sinLam, cosLam = np.sin(lam), np.cos(lam)
+        sinSigma = np.hypot(cosU2 * sinLam, cosU1 * sinU2 - sinU1 * cosU2 * cosLam)
+        cosSigma = sinU1 * sinU2 + cosU1 * cosU2 * cosLam
+        sigma = np.arctan2(sinSigma, cosSigma)
+        # coincident points have sinSigma = 0
+        sinSigma_safe = np.where(sinSigma == 0, 1., sinSigma)
+        sinAlpha = np.where(sinSigma == 0, 0., cosU1 * cosU2 * sinLam / sinSigma_safe)
+        cos2Alpha = 1 - sinAlpha ** 2
+        # points on the equator have cos2Alpha = 0
+        cos2Alpha_safe = np.where(cos2Alpha == 0, 1., cos2Alpha)
+        cos2SigmaM = np.where(cos2Alpha == 0, 0., cosSigma - 2 * sinU1 * sinU2 / cos2Alpha_safe)
+        C = f / 16 * cos2Alpha * (4 + f * (4 - 3 * cos2Alpha))
+        lam_previous = lam
+        lam = L + (1 - C) * f * sinAlpha * (sigma + C * sinSigma * (cos2SigmaM + C * cosSigma * (-1 + 2 * cos2SigmaM ** 2)))
+        delta = np.abs(lam - lam_previous)
+        if np.all((delta < tolerance) | np.isnan(delta)):
+            break
+    u2 = cos2Alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    deltaSigma = B * sinSigma * (cos2SigmaM + B / 4 * (cosSigma * (-1 + 2 * cos2SigmaM ** 2)
+                 - B / 6 * cos2SigmaM * (-3 + 4 * sinSigma ** 2) * (-3 + 4 * cos2SigmaM ** 2)))
+    return b * A * (sigma - deltaSigma)
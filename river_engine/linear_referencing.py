@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ Linear referencing of points on a river centerline, using plain NumPy
+ arrays so that it can run without SQLite / SpatiaLite.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import numpy as np
+
+from .cache import FileCache
+
+# maximum number of point x segment pairs evaluated at once when projecting
+BLOCK_SIZE = 2000000
+# centerlines with more segments than this are projected on with a spatial index
+INDEX_MIN_SEGMENTS = 64
+# maximum number of cells on each side of spatial index grid
+INDEX_MAX_CELLS_PER_SIDE = 4096
+# points not found within this number of cells are compared with all segments
+INDEX_MAX_RADIUS = 16
+
+
+class Centerline:
+    """
+    A river centerline stored as flat vertex arrays.
+
+    The centerline can have several parts (lines that could not be merged),
+    chainage then runs through the parts one after the other.
+    """
+
+    def __init__(self, parts, measure=None):
+        # parts : list of lines, each line being a sequence of (x, y) vertices
+        # measure : optional function giving the length of segments from arrays x0, y0, x1, y1,
+        # e.g. ellipsoidal lengths for geographic coordinates, planar lengths are used otherwise
+        xs, ys, part_ids = [], [], []
+        for part_id, part in enumerate(parts):
+            # a line needs at least 2 vertices to have segments
+            if len(part) < 2:
+                continue
+            coords = np.asarray(part, dtype=float)
+            xs.append(coords[:, 0])
+            ys.append(coords[:, 1])
+            part_ids.append(np.full(len(coords), part_id))
+        if not xs:
+            raise ValueError('centerline has no line with at least 2 vertices')
+        self.x = np.concatenate(xs)
+        self.y = np.concatenate(ys)
+        vertex_part = np.concatenate(part_ids)
+        # a segment goes from vertex i to vertex i+1, if both are in the same part
+        valid = vertex_part[:-1] == vertex_part[1:]
+        self.segment_start = np.nonzero(valid)[0]
+        self.segment_part = vertex_part[self.segment_start]
+        self.x0 = self.x[self.segment_start]
+        self.y0 = self.y[self.segment_start]
+        self.dx = self.x[self.segment_start + 1] - self.x0
+        self.dy = self.y[self.segment_start + 1] - self.y0
+        # squared planar length, used to project points on segments
+        self.segment_length2 = self.dx ** 2 + self.dy ** 2
+        if measure is None:
+            self.segment_length = np.sqrt(self.segment_length2)
+        else:
+            self.segment_length = np.asarray(measure(self.x0, self.y0, self.x0 + self.dx, self.y0 + self.dy), dtype=float)
+        # cumulative length array : chainage at the start of each segment
+        self.segment_chainage = np.concatenate(([0.], np.cumsum(self.segment_length)[:-1]))
+        self.length = float(self.segment_length.sum())
+        # spatial index of segments, built on first projection of a long centerline
+        self.index = None
+
+    @property
+    def segment_count(self):
+        return len(self.segment_start)
+
+    # number of parts with at least one segment
+    @property
+    def part_count(self):
+        return len(np.unique(self.segment_part))
+
+    # key identifying vertices and segment lengths of centerline, projections on centerlines with same key are the same
+    def fingerprint(self):
+        return FileCache.key(type(self).__name__, self.x.tobytes(), self.y.tobytes(), self.segment_length.tobytes())
+
+    # build spatial index of segments if centerline is long enough to need one, it is built on first projection otherwise
+    # threads projecting points at the same time should share an index built beforehand
+    def prepare(self):
+        if self.segment_count > INDEX_MIN_SEGMENTS and self.index is None:
+            self.index = SegmentIndex(self.x0, self.y0, self.x0 + self.dx, self.y0 + self.dy)
+
+    # project points on centerline, returns a dictionary of arrays :
+    # x, y : projected point, segment : index of closest segment,
+    # chainage : curvilinear position along centerline, distance : offset between point and centerline,
+    # side : 1 if point is on the left of centerline direction (left bank if centerline goes downstream),
+    # -1 if it is on the right, 0 if it is on centerline, offset : distance signed by side
+    # side is relative to the digitizing direction, multiply it by flow_sign to get it relative to flow
+    def project(self, px, py, feedback=None):
+        px = np.asarray(px, dtype=float)
+        py = np.asarray(py, dtype=float)
+        # closest segment of each point, and position of projection on it between 0 and 1
+        if self.segment_count > INDEX_MIN_SEGMENTS:
+            self.prepare()
+            closest = self._closestIndexed(px, py, feedback)
+        else:
+            closest = self._closestAll(px, py, feedback)
+        if closest is None:
+            return None
+        best, best_t = closest
+        x = self.x0[best] + best_t * self.dx[best]
+        y = self.y0[best] + best_t * self.dy[best]
+        distance = np.hypot(px - x, py - y)
+        # side from the sign of the cross product of segment direction and vector from segment start to point
+        side = np.sign(self.dx[best] * (py - self.y0[best]) - self.dy[best] * (px - self.x0[best])).astype(np.int64)
+        return {'x': x,
+                'y': y,
+                'segment': best,
+                'chainage': self.segment_chainage[best] + best_t * self.segment_length[best],
+                'distance': distance,
+                'side': side,
+                'offset': side * distance}
+
+    # parts of segments, as returned by project, -1 for NaN segments of missing points
+    def part_of(self, segment):
+        segment = np.asarray(segment, dtype=float)
+        valid = ~np.isnan(segment)
+        return np.where(valid, self.segment_part[np.where(valid, segment, 0).astype(np.int64)], -1)
+
+    # along-river distance between pairs of points given their chainages and closest segments, as returned by project
+    # chainage runs through parts one after the other, so distance is NaN between points on different parts
+    def distance(self, chainage1, chainage2, feedback=None, segment1=None, segment2=None):
+        distances = chainage_distance(chainage1, chainage2)
+        if self.part_count > 1:
+            if segment1 is None or segment2 is None:
+                raise ValueError('distances along a centerline with several parts need segments of points')
+            distances[self.part_of(segment1) != self.part_of(segment2)] = np.nan
+        return distances
+
+    # outlet of river given its coordinates, as used by flow_position : chainage of its projection on centerline
+    def locate_outlet(self, x, y):
+        return float(self.project([x], [y])['chainage'][0])
+
+    # 1 where flow goes along the digitizing direction of centerline, -1 where it goes against it
+    # outlet : river outlet as returned by locate_outlet, if None centerline is drawn downstream
+    def flow_sign(self, chainage, outlet=None, segment=None):
+        if self.part_count > 1:
+            raise ValueError('flow direction of a centerline with several parts needs a river network')
+        chainage = np.asarray(chainage, dtype=float)
+        if outlet is None:
+            return np.ones(chainage.shape, dtype=np.int64)
+        # flow goes towards outlet
+        return np.where(chainage > outlet, -1, 1)
+
+    # position of points along flow, increasing downstream, from their chainages
+    # outlet : river outlet as returned by locate_outlet, if None centerline is drawn downstream and chainage is the position
+    # segment : closest segments of points, only needed by river networks
+    # chainage runs through parts one after the other, so flow is only defined along a single part
+    # returns an array, NaN for NaN chainages
+    def flow_position(self, chainage, outlet=None, segment=None):
+        if self.part_count > 1:
+            raise ValueError('flow direction of a centerline with several parts needs a river network')
+        chainage = np.asarray(chainage, dtype=float)
+        if outlet is None:
+            return chainage
+        # the closer to the outlet, the further downstream
+        return -np.abs(chainage - outlet)
+
+    # position of projection of points on segments, between 0 and 1, and squared distance to projection
+    # px, py and segments are broadcast together
+    def _projectOnSegments(self, px, py, segments):
+        x0, y0 = self.x0[segments], self.y0[segments]
+        dx, dy = self.dx[segments], self.dy[segments]
+        len2 = self.segment_length2[segments]
+        # avoid division by zero for duplicated vertices
+        t = ((px - x0) * dx + (py - y0) * dy) / np.where(len2 > 0, len2, 1.)
+        t = np.clip(t, 0., 1.)
+        d2 = (px - x0 - t * dx) ** 2 + (py - y0 - t * dy) ** 2
+        return t, d2
+
+    # closest segment of points, comparing each point with all segments
+    # progress is reported as the percentage of points done, if feedback can report it
+    def _closestAll(self, px, py, feedback=None):
+        n = len(px)
+        best = np.empty(n, dtype=np.int64)
+        best_t = np.empty(n)
+        segments = np.arange(self.segment_count)
+        step = max(1, BLOCK_SIZE // max(1, self.segment_count))
+        for start in range(0, n, step):
+            if feedback is not None and feedback.isCanceled():
+                return None
+            stop = min(n, start + step)
+            t, d2 = self._projectOnSegments(px[start:stop, None], py[start:stop, None], segments)
+            block_best = np.argmin(d2, axis=1)
+            best[start:stop] = block_best
+            best_t[start:stop] = t[np.arange(stop - start), block_best]
+            _progress(feedback, stop, n)
+        return best, best_t
+
+    # closest segment of points, comparing each point only with segments in neighbouring cells of spatial index
+    # search radius is doubled for points whose closest segment can be further than searched cells
+    def _closestIndexed(self, px, py, feedback=None):
+        n = len(px)
+        best = np.empty(n, dtype=np.int64)
+        best_t = np.empty(n)
+        pending = np.arange(n)
+        done = 0
+        radius = 1
+        while len(pending) and radius <= INDEX_MAX_RADIUS:
+            unresolved = []
+            step = max(1, BLOCK_SIZE // ((2 * radius + 1) ** 2 * self.index.mean_cell_count))
+            for start in range(0, len(pending), step):
+                if feedback is not None and feedback.isCanceled():
+                    return None
+                block = pending[start:start + step]
+                pair_points, pair_segments = self.index.candidates(px[block], py[block], radius)
+                t, d2 = self._projectOnSegments(px[block][pair_points], py[block][pair_points], pair_segments)
+                # closest candidate of each point, lowest segment index first in case of equality
+                order = np.lexsort((pair_segments, d2, pair_points))
+                points, first = np.unique(pair_points[order], return_index=True)
+                chosen = order[first]
+                # a segment closer than radius cells is always among candidates
+                found = d2[chosen] <= (radius * self.index.cell_size) ** 2
+                best[block[points[found]]] = pair_segments[chosen[found]]
+                best_t[block[points[found]]] = t[chosen[found]]
+                resolved = np.zeros(len(block), dtype=bool)
+                resolved[points[found]] = True
+                unresolved.append(block[~resolved])
+                done += int(found.sum())
+                _progress(feedback, done, n)
+            pending = np.concatenate(unresolved)
+            radius *= 2
+        # points far from centerline are compared with all segments
+        if len(pending):
+            closest = self._closestAll(px[pending], py[pending], feedback)
+            if closest is None:
+                return None
+            best[pending], best_t[pending] = closest
+        return best, best_t
+
+
+# report progress of done items among total to feedback, if it has a setProgress method
+def _progress(feedback, done, total):
+    if feedback is not None and hasattr(feedback, 'setProgress') and total:
+        feedback.setProgress(100 * done / total)
+
+
+class SegmentIndex:
+    """
+    Spatial index of segments : a regular grid of square cells, each cell
+    listing the segments whose bounding box overlaps it.
+    """
+
+    def __init__(self, x0, y0, x1, y1, cell_size=None):
+        xmin, xmax = np.minimum(x0, x1), np.maximum(x0, x1)
+        ymin, ymax = np.minimum(y0, y1), np.maximum(y0, y1)
+        self.origin_x = xmin.min()
+        self.origin_y = ymin.min()
+        if cell_size is None:
+            # compromise between cells as large as segments, and cells as large as extent / sqrt(number of segments)
+            # (the size for which a long river has as many segments per cell as cells along it), but not too many cells
+            extent = max(xmax.max() - self.origin_x, ymax.max() - self.origin_y)
+            median_length = float(np.median(np.hypot(x1 - x0, y1 - y0)))
+            cell_size = max(np.sqrt(median_length * extent / np.sqrt(len(x0))), extent / INDEX_MAX_CELLS_PER_SIDE)
+        self.cell_size = cell_size if cell_size > 0 else 1.
+        ix0, iy0 = self.cell(xmin, ymin)
+        ix1, iy1 = self.cell(xmax, ymax)
+        self.nx = int(ix1.max()) + 1
+        self.ny = int(iy1.max()) + 1
+        # one (segment, cell) pair for each cell overlapped by bounding box of segment
+        widths = ix1 - ix0 + 1
+        counts = widths * (iy1 - iy0 + 1)
+        segments = np.repeat(np.arange(len(x0)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = np.repeat(ix0, counts) + local % np.repeat(widths, counts)
+        cy = np.repeat(iy0, counts) + local // np.repeat(widths, counts)
+        keys = cx * self.ny + cy
+        # segments sorted by cell, with start and end of each cell in this list
+        order = np.argsort(keys, kind='stable')
+        self.segments = segments[order]
+        self.cell_keys, self.cell_start = np.unique(keys[order], return_index=True)
+        self.cell_end = np.append(self.cell_start[1:], len(order))
+        self.mean_cell_count = max(1, int(np.ceil(len(order) / len(self.cell_keys))))
+
+    # column and row of cells containing points
+    def cell(self, x, y):
+        ix = np.floor((np.asarray(x) - self.origin_x) / self.cell_size).astype(np.int64)
+        iy = np.floor((np.asarray(y) - self.origin_y) / self.cell_size).astype(np.int64)
+        return ix, iy
+
+    # candidate segments for points : segments in cells at most radius cells away from the cell of each point
+    # returns (point index, segment index) pairs, a segment can be listed more than once for a point
+    def candidates(self, px, py, radius):
+        ix, iy = self.cell(px, py)
+        offsets = np.arange(-radius, radius + 1)
+        ox, oy = np.meshgrid(offsets, offsets)
+        cx = ix[:, None] + ox.ravel()
+        cy = iy[:, None] + oy.ravel()
+        points = np.broadcast_to(np.arange(len(px))[:, None], cx.shape)
+        valid = (cx >= 0) & (cx < self.nx) & (cy >= 0) & (cy < self.ny)
+        keys = (cx * self.ny + cy)[valid]
+        points = points[valid]
+        # keep only cells containing segments
+        position = np.clip(np.searchsorted(self.cell_keys, keys), 0, len(self.cell_keys) - 1)
+        found = self.cell_keys[position] == keys
+        position, points = position[found], points[found]
+        starts, counts = self.cell_start[position], self.cell_end[position] - self.cell_start[position]
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(points, counts), self.segments[np.repeat(starts, counts) + local]
+
+
+# along-river distance between pairs of points, given their chainages
+def chainage_distance(chainage1, chainage2):
+    return np.abs(np.asarray(chainage2, dtype=float) - np.asarray(chainage1, dtype=float))
+
+
+# along-river distance between pairs of points signed by flow direction, given their positions as returned by
+# Centerline.flow_position : positive if 2nd point is downstream of 1st point, negative if it is upstream,
+# NaN if a position is NaN
+def signed_distance(distance, position1, position2):
+    position1 = np.asarray(position1, dtype=float)
+    position2 = np.asarray(position2, dtype=float)
+    sign = np.where(position2 < position1, -1., 1.)
+    sign[np.isnan(position1) | np.isnan(position2)] = np.nan
+    return sign * np.asarray(distance, dtype=float)
+
+
+# along-river distances between all pairs of points of 2 sets, calculated by blocks of rows so that memory stays bounded
+# only pairs closer than max_distance are kept if it is given, they are found with a binary search in sorted chainages
+# distance : optional function giving distances from arrays of indices in chainage1 and chainage2, e.g. shortest
+# paths in a river network, the difference of chainages is used otherwise
+# yields (rows, columns, distances) arrays for each block, rows and columns being indices in chainage1 and chainage2
+def chainage_distance_matrix(chainage1, chainage2, max_distance=None, distance=None, block_size=BLOCK_SIZE):
+    chainage1 = np.asarray(chainage1, dtype=float)
+    chainage2 = np.asarray(chainage2, dtype=float)
+    order = np.argsort(chainage2, kind='stable')
+    sorted2 = chainage2[order]
+    columns = np.arange(len(chainage2))
+    step = max(1, block_size // max(1, len(chainage2)))
+    for start in range(0, len(chainage1), step):
+        rows = np.arange(start, min(start + step, len(chainage1)))
+        if distance is not None:
+            # no ordering of distances in a network, all pairs are calculated
+            pair_rows = np.repeat(rows, len(columns))
+            pair_columns = np.tile(columns, len(rows))
+            distances = np.asarray(distance(pair_rows, pair_columns), dtype=float)
+            if max_distance is not None:
+                near = distances <= max_distance
+                pair_rows, pair_columns, distances = pair_rows[near], pair_columns[near], distances[near]
+        elif max_distance is None:
+            pair_rows = np.repeat(rows, len(columns))
+            pair_columns = np.tile(columns, len(rows))
+            distances = np.abs(chainage2[None, :] - chainage1[rows, None]).ravel()
+        else:
+            # points of 2nd set closer than max_distance are contiguous in sorted chainages
+            low = np.searchsorted(sorted2, chainage1[rows] - max_distance, side='left')
+            high = np.searchsorted(sorted2, chainage1[rows] + max_distance, side='right')
+            counts = high - low
+            local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            positions = np.repeat(low, counts) + local
+            pair_rows = np.repeat(rows, counts)
+            pair_columns = order[positions]
+            distances = np.abs(sorted2[positions] - chainage1[pair_rows])
+            # pairs of a row in the order of 2nd set, as without max_distance
+            pair_order = np.lexsort((pair_columns, pair_rows))
+            pair_rows, pair_columns, distances = pair_rows[pair_order], pair_columns[pair_order], distances[pair_order]
+        yield pair_rows, pair_columns, distances
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ River network made of several branches (braided channels, tributaries),
+ with distances along river calculated as shortest paths between branches.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import heapq
+
+import numpy as np
+
+from .linear_referencing import Centerline
+
+
+# split lines into branches going from node to node, a node being a line end or a vertex shared by several lines
+# parts : list of lines, each line being a sequence of (x, y) vertices
+# returns a list of branches (lists of (x, y) tuples) and a list of node coordinates
+def split_branches(parts):
+    parts = [[tuple(map(float, vertex)) for vertex in part] for part in parts if len(part) >= 2]
+    # number of lines going through each vertex
+    occurrences = {}
+    for part in parts:
+        for vertex in set(part):
+            occurrences[vertex] = occurrences.get(vertex, 0) + 1
+    nodes = {}
+    for part in parts:
+        nodes.setdefault(part[0], len(nodes))
+        nodes.setdefault(part[-1], len(nodes))
+    for vertex, count in occurrences.items():
+        if count > 1:
+            nodes.setdefault(vertex, len(nodes))
+    branches = []
+    for part in parts:
+        branch = [part[0]]
+        for vertex in part[1:]:
+            branch.append(vertex)
+            if vertex in nodes:
+                branches.append(branch)
+                branch = [vertex]
+    return branches, list(nodes)
+
+
+class RiverNetwork(Centerline):
+    """
+    A river network : a graph whose edges are branches of the river and
+    whose nodes are confluences, diffluences and branch ends.
+
+    Points are projected on branches as on a centerline whose parts are the
+    branches, distances along river between points are the length of the
+    shortest path between them in the graph (Dijkstra algorithm).
+    """
+
+    def __init__(self, parts, measure=None):
+        branches, nodes = split_branches(parts)
+        if not branches:
+            raise ValueError('river network has no line with at least 2 vertices')
+        super().__init__(branches, measure)
+        node_ids = {node: i for i, node in enumerate(nodes)}
+        self.node_xy = np.asarray(nodes, dtype=float)
+        self.node_count = len(nodes)
+        self.branch_count = len(branches)
+        self.branch_from = np.array([node_ids[branch[0]] for branch in branches])
+        self.branch_to = np.array([node_ids[branch[-1]] for branch in branches])
+        self.branch_length = np.bincount(self.segment_part, weights=self.segment_length, minlength=self.branch_count)
+        # chainage at the start of each branch, branches being one after the other as centerline parts
+        self.branch_chainage = np.concatenate(([0.], np.cumsum(self.branch_length)[:-1]))
+        # shortest branch between each pair of connected nodes, as (neighbour, length) lists
+        shortest = {}
+        for a, b, length in zip(self.branch_from, self.branch_to, self.branch_length):
+            if a != b:
+                key = (min(a, b), max(a, b))
+                shortest[key] = min(length, shortest.get(key, np.inf))
+        self.neighbours = [[] for _ in range(self.node_count)]
+        for (a, b), length in shortest.items():
+            self.neighbours[a].append((b, length))
+            self.neighbours[b].append((a, length))
+        # distances from a node to all nodes, calculated once for each node when needed
+        self.node_distances = {}
+
+    # number of branches joining at each node
+    def node_degree(self):
+        return np.bincount(np.concatenate((self.branch_from, self.branch_to)), minlength=self.node_count)
+
+    # shortest distances from a node to all nodes with Dijkstra algorithm, infinite for unconnected nodes
+    def distances_from(self, node):
+        if node not in self.node_distances:
+            distances = np.full(self.node_count, np.inf)
+            distances[node] = 0.
+            queue = [(0., node)]
+            while queue:
+                distance, current = heapq.heappop(queue)
+                if distance > distances[current]:
+                    continue
+                for neighbour, length in self.neighbours[current]:
+                    if distance + length < distances[neighbour]:
+                        distances[neighbour] = distance + length
+                        heapq.heappush(queue, (distance + length, neighbour))
+            self.node_distances[node] = distances
+        return self.node_distances[node]
+
+    # branch of chainages, and position along this branch
+    # segment : closest segments of points, as returned by project, their branch is the part of their segment
+    # without segments, branch is found from chainage, but chainage at the end of a branch is the same as at the
+    # start of next branch : a point at a branch end is then placed at the start of next branch
+    # NaN segments, of points missing in a layer, are placed on first branch
+    def locate(self, chainage, segment=None):
+        chainage = np.asarray(chainage, dtype=float)
+        if segment is None:
+            branch = np.clip(np.searchsorted(self.branch_chainage, chainage, side='right') - 1, 0, self.branch_count - 1)
+        else:
+            segment = np.asarray(segment, dtype=float)
+            branch = self.segment_part[np.where(np.isnan(segment), 0, segment).astype(np.int64)]
+        position = np.clip(chainage - self.branch_chainage[branch], 0., self.branch_length[branch])
+        return branch, position
+
+    # outlet of network given its coordinates : closest node, the outlet being a river end
+    # a chainage can't be used, chainage at the end of a branch being the same as at the start of next branch
+    def locate_outlet(self, x, y):
+        return int(np.argmin(np.hypot(self.node_xy[:, 0] - x, self.node_xy[:, 1] - y)))
+
+    # position of points along flow, increasing downstream : opposite of their distance to outlet along the network
+    # there is no flow direction through a network without an outlet, outlet is needed
+    # segment : closest segments of points, as returned by project, see locate
+    # NaN for NaN chainages and points not connected to outlet
+    def flow_position(self, chainage, outlet=None, segment=None):
+        if outlet is None:
+            raise ValueError('flow direction in a river network needs its outlet')
+        chainage = np.asarray(chainage, dtype=float)
+        valid = ~np.isnan(chainage)
+        branch, position = self.locate(np.where(valid, chainage, 0.), segment)
+        # shortest path to outlet leaves branch by one of its ends
+        to_outlet = self.distances_from(outlet)
+        distances = np.minimum(position + to_outlet[self.branch_from[branch]],
+                               self.branch_length[branch] - position + to_outlet[self.branch_to[branch]])
+        distances[~valid | np.isinf(distances)] = np.nan
+        return -distances
+
+    # 1 where flow goes along the digitizing direction of branches, -1 where it goes against it, flow going
+    # towards outlet by the shortest path, 1 on branches not connected to outlet
+    def flow_sign(self, chainage, outlet=None, segment=None):
+        if outlet is None:
+            raise ValueError('flow direction in a river network needs its outlet')
+        chainage = np.asarray(chainage, dtype=float)
+        branch, position = self.locate(np.where(np.isnan(chainage), 0., chainage), segment)
+        to_outlet = self.distances_from(outlet)
+        via_from = position + to_outlet[self.branch_from[branch]]
+        via_to = self.branch_length[branch] - position + to_outlet[self.branch_to[branch]]
+        return np.where(via_from < via_to, -1, 1)
+
+    # along-river distance between pairs of points given their chainages and closest segments, as returned by project
+    # segments should be given, points at branch ends are misplaced otherwise (see locate)
+    # NaN if a chainage is NaN or if points are on unconnected branches, None if cancelled
+    def distance(self, chainage1, chainage2, feedback=None, segment1=None, segment2=None):
+        chainage1 = np.asarray(chainage1, dtype=float)
+        chainage2 = np.asarray(chainage2, dtype=float)
+        valid = ~(np.isnan(chainage1) | np.isnan(chainage2))
+        branch1, position1 = self.locate(np.where(valid, chainage1, 0.), segment1)
+        branch2, position2 = self.locate(np.where(valid, chainage2, 0.), segment2)
+        # points on the same branch can go along it
+        best = np.where(branch1 == branch2, np.abs(position2 - position1), np.inf)
+        # or leave their branch by one of its ends, then take shortest path between branch ends
+        ends2 = ((self.branch_from[branch2], position2), (self.branch_to[branch2], self.branch_length[branch2] - position2))
+        for end1, offset1 in ((self.branch_from[branch1], position1), (self.branch_to[branch1], self.branch_length[branch1] - position1)):
+            for node in np.unique(end1[valid]):
+                if feedback is not None and feedback.isCanceled():
+                    return None
+                pairs = valid & (end1 == node)
+                distances = self.distances_from(node)
+                for end2, offset2 in ends2:
+                    best[pairs] = np.minimum(best[pairs], offset1[pairs] + distances[end2[pairs]] + offset2[pairs])
+        best[~valid | np.isinf(best)] = np.nan
+        return best
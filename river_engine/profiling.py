@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ Wall time, peak memory and feature counts of the stages of an algorithm,
+ reported through processing feedback and saved as a JSON profile.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# resource module is not available on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# peak resident memory of process since it started, in MB, None if it can't be known
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == 'darwin':
+        return rss / 1024 ** 2
+    return rss / 1024
+
+
+class StageProfiler:
+    """
+    Records wall time, peak memory and feature count of each stage.
+
+    stages : names of the stages the algorithm is expected to run, in order.
+    If feedback is a multi step feedback, its current step is set to the
+    index of each stage in this list when it starts, so that progress moves
+    forward even when some stages are skipped.
+    If trace_memory is True, the peak of memory allocated by each stage is
+    measured with tracemalloc, which slows stages down, so it is only done
+    when a profile is asked for. Peak resident memory is only known for the
+    whole process, it is reported once.
+    """
+
+    def __init__(self, stages, feedback=None, trace_memory=False):
+        self.planned = list(stages)
+        self.feedback = feedback
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    # context manager measuring one stage, yields a dictionary where the stage can set its feature count
+    @contextmanager
+    def stage(self, name, features=None):
+        record = {'stage': name, 'features': features}
+        if name in self.planned and hasattr(self.feedback, 'setCurrentStep'):
+            self.feedback.setCurrentStep(self.planned.index(name))
+        # memory allocated by this stage only : tracing starts with the stage, or its peak is reset
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if self.trace_memory:
+            if tracing:
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+            memory_start = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            record['peak_memory_mb'] = None
+            if self.trace_memory:
+                record['peak_memory_mb'] = (tracemalloc.get_traced_memory()[1] - memory_start) / 1024 ** 2
+                if not tracing:
+                    tracemalloc.stop()
+            self.stages.append(record)
+            if self.feedback is not None:
+                message = f"{name} : {record['seconds']:.3f} s"
+                if record['features'] is not None:
+                    message += f", {record['features']} features"
+                if record['peak_memory_mb'] is not None:
+                    message += f", peak memory {record['peak_memory_mb']:.0f} MB"
+                self.feedback.pushDebugInfo(message)
+
+    # peak resident memory is the peak of the whole process, e.g. of the whole QGIS session
+    def report(self):
+        return {'stages': self.stages,
+                'total_seconds': sum(record['seconds'] for record in self.stages),
+                'process_peak_rss_mb': peak_rss_mb()}
+
+    # save report as a JSON file
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+class SharedProgress:
+    """
+    Progress of tasks running at the same time, e.g. in threads, reported to
+    one feedback as the mean progress of all tasks.
+
+    Each task gets its own feedback from task(index), with isCanceled and
+    setProgress methods, progress of a task going from 0 to 100.
+    """
+
+    def __init__(self, feedback, count):
+        self.feedback = feedback
+        self.progress = [0.] * count
+
+    def task(self, index):
+        return TaskFeedback(self, index)
+
+    def set(self, index, progress):
+        self.progress[index] = progress
+        self.feedback.setProgress(sum(self.progress) / len(self.progress))
+
+
+class TaskFeedback:
+    """Feedback of one task of a SharedProgress, cancelled with the shared feedback."""
+
+    def __init__(self, shared, index):
+        self.shared = shared
+        self.index = index
+
+    def isCanceled(self):
+        return self.shared.feedback.isCanceled()
+
+    def setProgress(self, progress):
+        self.shared.set(self.index, progress)
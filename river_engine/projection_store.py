@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ Projections of points on centerlines kept between runs, so that only new or
+ moved points of a layer are projected again.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import os
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+
+# columns of projection results, as returned by Centerline.project
+RESULT_COLUMNS = ['x', 'y', 'segment', 'chainage', 'distance', 'side', 'offset']
+# result columns holding integers, others are reals
+INTEGER_COLUMNS = ['segment', 'side']
+
+
+class ProjectionStore:
+    """
+    SQLite database of point projections on centerlines.
+
+    A projection is stored for a centerline fingerprint, a layer key and a
+    point id, along with the point coordinates : it is reused as long as the
+    point has the same coordinates and the centerline does not change.
+    Only projections on the last centerline a layer was projected on are
+    kept, so that the store doesn't grow with each new centerline.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        result_columns = ', '.join(f'{name} {"INTEGER" if name in INTEGER_COLUMNS else "REAL"}' for name in RESULT_COLUMNS)
+        with closing(self._connect()) as connection, connection:
+            # store is only a cache : a table written by a previous version, without all result columns, is dropped
+            columns = [row[1] for row in connection.execute('PRAGMA table_info(projections)')]
+            if columns and not set(RESULT_COLUMNS).issubset(columns):
+                connection.execute('DROP TABLE projections')
+            connection.execute('CREATE TABLE IF NOT EXISTS projections (centerline TEXT NOT NULL, layer TEXT NOT NULL, '
+                               f'point_id TEXT NOT NULL, point_x REAL, point_y REAL, {result_columns}, '
+                               'PRIMARY KEY (centerline, layer, point_id))')
+
+    # a new connection is used for each operation, so that the store can be used from several threads
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=60)
+
+    # projections of points of a layer found in store, for points with the same coordinates as when they were stored
+    # returns a boolean array telling which points were found, and a dictionary of result arrays (NaN if not found)
+    def lookup(self, centerline_key, layer_key, ids, xs, ys):
+        with closing(self._connect()) as connection, connection:
+            rows = connection.execute(f'SELECT point_id, point_x, point_y, {", ".join(RESULT_COLUMNS)} FROM projections '
+                                      'WHERE centerline = ? AND layer = ?', (centerline_key, layer_key)).fetchall()
+        stored = {row[0]: row[1:] for row in rows}
+        found = np.zeros(len(ids), dtype=bool)
+        values = np.full((len(ids), len(RESULT_COLUMNS)), np.nan)
+        for i, (point_id, x, y) in enumerate(zip(ids, xs, ys)):
+            row = stored.get(repr(point_id))
+            if row is not None and row[0] == x and row[1] == y:
+                found[i] = True
+                values[i] = row[2:]
+        result = {name: values[:, j] for j, name in enumerate(RESULT_COLUMNS)}
+        return found, result
+
+    # store projections of points of a layer, replacing previous projections of the same ids,
+    # and removing projections of this layer on other centerlines
+    def save(self, centerline_key, layer_key, ids, xs, ys, result):
+        rows = zip([centerline_key] * len(ids), [layer_key] * len(ids), [repr(point_id) for point_id in ids],
+                   np.asarray(xs, dtype=float).tolist(), np.asarray(ys, dtype=float).tolist(),
+                   *[np.asarray(result[name]).tolist() for name in RESULT_COLUMNS])
+        placeholders = ', '.join(['?'] * (5 + len(RESULT_COLUMNS)))
+        with closing(self._connect()) as connection, connection:
+            connection.execute('DELETE FROM projections WHERE layer = ? AND centerline != ?', (layer_key, centerline_key))
+            connection.executemany(f'INSERT OR REPLACE INTO projections (centerline, layer, point_id, point_x, point_y, '
+                                   f'{", ".join(RESULT_COLUMNS)}) VALUES ({placeholders})', rows)
+
+
+# project points of a layer on centerline, reusing projections found in store and storing new ones
+# returns the projection result as Centerline.project and the number of reused projections, None if cancelled
+def project_incremental(centerline, store, layer_key, ids, xs, ys, feedback=None):
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    centerline_key = centerline.fingerprint()
+    found, result = store.lookup(centerline_key, layer_key, ids, xs, ys)
+    missing = np.nonzero(~found)[0]
+    if len(missing):
+        projected = centerline.project(xs[missing], ys[missing], feedback)
+        if projected is None:
+            return None
+        for name in RESULT_COLUMNS:
+            result[name][missing] = projected[name]
+        store.save(centerline_key, layer_key, [ids[i] for i in missing], xs[missing], ys[missing], projected)
+    for name in INTEGER_COLUMNS:
+        result[name] = result[name].astype(np.int64)
+    return result, int(found.sum())
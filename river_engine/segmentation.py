@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ Segmentation of a river into boxes, cut by transects perpendicular to its
+ centerline at regular chainages.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import numpy as np
+
+# maximum lengthening of transects at sharp bends
+MAX_MITER = 4.
+
+
+# unit vectors perpendicular to directions, pointing to the left
+def _left_normals(directions):
+    return np.column_stack((-directions[:, 1], directions[:, 0]))
+
+
+# unit directions of segments of a line, zero length segments get the direction of previous segment
+def _segment_directions(xy):
+    delta = np.diff(xy, axis=0)
+    lengths = np.hypot(delta[:, 0], delta[:, 1])
+    directions = np.zeros_like(delta)
+    valid = lengths > 0
+    directions[valid] = delta[valid] / lengths[valid, None]
+    for i in np.nonzero(~valid)[0]:
+        directions[i] = directions[i - 1] if i > 0 else (1., 0.)
+    return directions, lengths
+
+
+# cut a line into boxes of given length along it, with transects perpendicular to the line
+# xy : (n, 2) array of line vertices, length : length of boxes along line
+# half_width : half length of transects, should be larger than half river width
+# returns a list of (ring, chainage, angle) for each box, ring being a closed (m, 2) array of vertices,
+# chainage the position of box middle along line, angle the line azimuth at box middle in degrees
+def box_rings(xy, length, half_width):
+    xy = np.asarray(xy, dtype=float)
+    directions, lengths = _segment_directions(xy)
+    total = lengths.sum()
+    if len(xy) < 2 or total == 0 or length <= 0:
+        return []
+    cumulative = np.concatenate(([0.], np.cumsum(lengths)))
+    # normals at vertices : mean of adjacent segment directions
+    vertex_directions = np.vstack((directions[:1], directions[:-1] + directions[1:], directions[-1:]))
+    norms = np.hypot(vertex_directions[:, 0], vertex_directions[:, 1])
+    # opposite directions (line going back on itself) keep direction of previous segment
+    opposite = norms == 0
+    vertex_directions[opposite] = np.vstack((directions[:1], directions))[opposite]
+    norms[opposite] = 1.
+    # at bends, normals are lengthened so that transects reach the outer bank (miter joins)
+    miter = np.ones(len(xy))
+    miter[1:-1] = np.minimum(2 / np.maximum(norms[1:-1], 1e-12), MAX_MITER)
+    miter[opposite] = 1.
+    vertex_normals = _left_normals(vertex_directions / norms[:, None]) * miter[:, None]
+    # chainages of transects, the last box is shorter if total length isn't a multiple of length
+    cuts = np.arange(0., total, length)
+    cuts = np.append(cuts, total)
+    # position and normal of transects, on the segment where they are
+    segment = np.clip(np.searchsorted(cumulative, cuts, side='right') - 1, 0, len(lengths) - 1)
+    t = (cuts - cumulative[segment]) / np.where(lengths[segment] > 0, lengths[segment], 1.)
+    cut_points = xy[segment] + t[:, None] * (xy[segment + 1] - xy[segment])
+    cut_normals = _left_normals(directions[segment])
+    # transects at line ends follow vertex normals
+    cut_normals[0] = vertex_normals[0]
+    cut_normals[-1] = vertex_normals[-1]
+    boxes = []
+    for k in range(len(cuts) - 1):
+        # vertices strictly between both transects
+        inside = np.nonzero((cumulative > cuts[k]) & (cumulative < cuts[k + 1]))[0]
+        points = np.vstack((cut_points[k], xy[inside], cut_points[k + 1]))
+        normals = np.vstack((cut_normals[k], vertex_normals[inside], cut_normals[k + 1]))
+        # first and last boxes are extended beyond line ends, to cover the whole river
+        if k == 0:
+            points = np.vstack((points[0] - half_width * directions[0], points))
+            normals = np.vstack((normals[:1], normals))
+        if k == len(cuts) - 2:
+            points = np.vstack((points, points[-1] + half_width * directions[-1]))
+            normals = np.vstack((normals, normals[-1:]))
+        left = points + half_width * normals
+        right = points - half_width * normals
+        ring = np.vstack((left, right[::-1], left[:1]))
+        # position and azimuth of box middle
+        middle = (cuts[k] + cuts[k + 1]) / 2
+        middle_segment = min(np.searchsorted(cumulative, middle, side='right') - 1, len(lengths) - 1)
+        dx, dy = directions[middle_segment]
+        angle = np.degrees(np.arctan2(dx, dy)) % 360
+        boxes.append((ring, float(middle), float(angle)))
+    return boxes
+
+
+# part of a line between two chainages, as a (m, 2) array of vertices
+def line_piece(xy, start, end):
+    xy = np.asarray(xy, dtype=float)
+    lengths = np.hypot(*np.diff(xy, axis=0).T)
+    cumulative = np.concatenate(([0.], np.cumsum(lengths)))
+    ends = np.column_stack((np.interp([start, end], cumulative, xy[:, 0]), np.interp([start, end], cumulative, xy[:, 1])))
+    inside = np.nonzero((cumulative > start) & (cumulative < end))[0]
+    return np.vstack((ends[:1], xy[inside], ends[1:]))
+
+
+# split chainages from 0 to total into windows of about chunk_length, starting on multiples of box length
+# returns a list of (start, end) chainages, a box belongs to the window containing its middle
+def chainage_windows(total, length, chunk_length):
+    step = max(1, int(chunk_length // length)) * length
+    return [(float(start), float(min(start + step, total))) for start in np.arange(0., total, step)]
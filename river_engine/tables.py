@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ Tables written chunk by chunk, as CSV, GeoPackage or Parquet files, so that
+ large tables never have to be held in memory.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+# table formats, from file extension
+TABLE_FORMATS = {'.csv': 'csv', '.gpkg': 'gpkg', '.parquet': 'parquet'}
+# column types : text, or real numbers
+TEXT = 'text'
+REAL = 'real'
+# number of rows written at once when a whole dataframe is written
+CHUNK_SIZE = 100000
+
+
+# format of a table from its file extension, csv if extension is unknown
+def table_format(path):
+    return TABLE_FORMATS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+
+# True if tables can be written in this format, parquet needs pyarrow, and GeoPackage GDAL python bindings
+# which are always installed with QGIS
+def format_available(table_format):
+    try:
+        if table_format == 'parquet':
+            import pyarrow.parquet  # noqa: F401
+        elif table_format == 'gpkg':
+            from osgeo import ogr  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class TableWriter:
+    """
+    Write a table chunk by chunk, each chunk being a dataframe.
+
+    columns : list of (name, type) of table columns, type being TEXT or REAL,
+    missing values are None or NaN. Use as a context manager, or call close()
+    once all chunks are written.
+    """
+
+    def __init__(self, path, columns, layer_name='distances', na_rep='NULL'):
+        self.path = path
+        self.columns = columns
+        self.layer_name = layer_name
+        self.format = table_format(path)
+        self.row_count = 0
+        if self.format == 'csv':
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+            self.na_rep = na_rep
+            # header is written even if there are no rows
+            pd.DataFrame(columns=[name for name, _ in columns]).to_csv(self._file, index=False)
+        elif self.format == 'gpkg':
+            self._openGeoPackage()
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self._schema = pa.schema([(name, pa.string() if kind == TEXT else pa.float64()) for name, kind in columns])
+            self._writer = pq.ParquetWriter(path, self._schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # columns of a chunk as lists of python values, None for missing values
+    def _values(self, df):
+        values = []
+        for name, kind in self.columns:
+            if kind == TEXT:
+                column = df[name].astype(object)
+                missing = column.isna().to_numpy()
+                values.append([None if m else str(v) for v, m in zip(column.tolist(), missing)])
+            else:
+                column = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float)
+                values.append(np.where(np.isnan(column), None, column).tolist())
+        return values
+
+    # create an empty GeoPackage with an attribute table with OGR, replacing existing file
+    # OGR writes GeoPackage metadata, rows are then inserted with SQLite, a whole chunk at once,
+    # the feature count of OGR being kept up to date by the triggers it adds when the file is closed
+    def _openGeoPackage(self):
+        from osgeo import ogr
+        driver = ogr.GetDriverByName('GPKG')
+        if os.path.exists(self.path):
+            driver.DeleteDataSource(self.path)
+        dataset = driver.CreateDataSource(self.path)
+        layer = dataset.CreateLayer(self.layer_name, geom_type=ogr.wkbNone)
+        for name, kind in self.columns:
+            layer.CreateField(ogr.FieldDefn(name, ogr.OFTString if kind == TEXT else ogr.OFTReal))
+        # dereferencing OGR dataset writes it to disk
+        del layer, dataset
+        self._connection = sqlite3.connect(self.path)
+        names = ', '.join('"{}"'.format(name) for name, _ in self.columns)
+        self._insert = f'INSERT INTO "{self.layer_name}" ({names}) VALUES ({", ".join("?" * len(self.columns))})'
+
+    # append rows of a dataframe to table
+    def write(self, df):
+        if len(df) == 0:
+            return
+        if self.format == 'csv':
+            df[[name for name, _ in self.columns]].to_csv(self._file, index=False, header=False, na_rep=self.na_rep)
+        elif self.format == 'gpkg':
+            # each chunk is inserted in a single transaction
+            self._connection.executemany(self._insert, zip(*self._values(df)))
+            self._connection.commit()
+        else:
+            import pyarrow as pa
+            arrays = [pa.array(values, type=field.type) for values, field in zip(self._values(df), self._schema)]
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        self.row_count += len(df)
+
+    # write a whole dataframe, by chunks of CHUNK_SIZE rows
+    def write_all(self, df):
+        for start in range(0, len(df), CHUNK_SIZE):
+            self.write(df.iloc[start:start + CHUNK_SIZE])
+
+    def close(self):
+        if self.format == 'csv':
+            self._file.close()
+        elif self.format == 'gpkg':
+            self._connection.close()
+        else:
+            self._writer.close()
@@ -31,8 +31,6 @@ __copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
 __revision__ = '$Format:%H$'
 
 from qgis.core import QgsProcessingProvider
-from .segmentation_boxes_processing_algorithm import SegmentationBoxesAlgorithm
-from .distance_along_river_processing_algorithm import DistanceAlongRiverAlgorithm
 
 
 class RiverToolsProvider(QgsProcessingProvider):
@@ -54,8 +52,14 @@ class RiverToolsProvider(QgsProcessingProvider):
         """
         Loads all algorithms belonging to this provider.
         """
+        # algorithm modules only import light modules, heavy ones (numpy, pandas, processing)
+        # are imported when an algorithm runs
+        from .segmentation_boxes_processing_algorithm import SegmentationBoxesAlgorithm
+        from .distance_along_river_processing_algorithm import DistanceAlongRiverAlgorithm
+        from .distance_along_river_batch_processing_algorithm import DistanceAlongRiverBatchAlgorithm
         self.addAlgorithm(SegmentationBoxesAlgorithm())
         self.addAlgorithm(DistanceAlongRiverAlgorithm())
+        self.addAlgorithm(DistanceAlongRiverBatchAlgorithm())
 
     def id(self):
         """
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+/***************************************************************************
+ RiverTools
+                                 A QGIS plugin
+ Collection of tools for studying rivers
+ Generated by Plugin Builder: http://g-sherman.github.io/Qgis-Plugin-Builder/
+                              -------------------
+        begin                : 2021-03-30
+        copyright            : (C) 2021 by J. Pierson, UMR 6554 LETG, CNRS
+        email                : julie.pierson@univ-brest.fr
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+ Functions shared by the River Tools processing algorithms.
+"""
+
+__author__ = 'J. Pierson, UMR 6554 LETG, CNRS'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import os
+
+from qgis.PyQt.QtCore import (QCoreApplication,
+                              QVariant)
+from qgis.core import (QgsApplication,
+                       QgsFeature,
+                       QgsFeatureRequest,
+                       QgsFeatureSink,
+                       QgsField,
+                       QgsFields,
+                       QgsGeometry,
+                       QgsProcessingUtils,
+                       QgsVectorFileWriter,
+                       QgsVectorLayer,
+                       QgsWkbTypes)
+from .river_engine.cache import FileCache
+from .river_engine.centerline import medial_axis
+
+# methods available to create a centerline from a polygon, in the order of the algorithms enum parameter
+CENTERLINE_METHODS = ['grass', 'native']
+CENTERLINE_METHOD_NAMES = ['GRASS v.voronoi.skeleton', 'Native Voronoi medial axis (no GRASS)']
+
+# directory where centerlines calculated from polygons are kept
+CENTERLINE_CACHE_DIR = os.path.join(QgsApplication.qgisSettingsDirPath(), 'river_tools', 'centerline_cache')
+
+# database where projections of points on centerlines are kept between runs
+PROJECTION_STORE_PATH = os.path.join(QgsApplication.qgisSettingsDirPath(), 'river_tools', 'projections.sqlite')
+
+
+# key of a centerline in cache : hash of polygon geometries, crs and skeleton parameters
+def centerlineCacheKey(polygon, algorithm, skeleton_param):
+    parts = [algorithm, polygon.crs().toWkt()]
+    parts += [(name, skeleton_param[name]) for name in sorted(skeleton_param)]
+    request = QgsFeatureRequest().setNoAttributes()
+    for f in polygon.getFeatures(request):
+        parts.append(bytes(f.geometry().asWkb()))
+    return FileCache.key(*parts)
+
+
+# number of features of a layer, from the provider when it knows it, features are read without geometry nor
+# attributes otherwise
+def layerFeatureCount(layer):
+    feature_count = layer.featureCount()
+    if feature_count < 0:
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setNoAttributes()
+        feature_count = sum(1 for _ in layer.getFeatures(request))
+    return feature_count
+
+
+# merge all lines of a layer, joining lines sharing an end point
+# returns a list of parts, each part being a list of (x, y) vertices
+def mergedLineParts(layer):
+    from .river_engine.api import merge_lines
+    request = QgsFeatureRequest().setNoAttributes()
+    return merge_lines([f.geometry() for f in layer.getFeatures(request) if f.hasGeometry()])
+
+
+# copy all features of a layer into destination (path, or 'memory:'), returns destination layer id or path
+def copyLayer(layer, destination, context):
+    sink, dest_id = QgsProcessingUtils.createFeatureSink(destination, context, layer.fields(), layer.wkbType(), layer.crs())
+    for f in layer.getFeatures():
+        sink.addFeature(f, QgsFeatureSink.FastInsert)
+    # deleting sink flushes features to disk
+    del sink
+    return dest_id
+
+
+# save a copy of a centerline layer in cache
+def cacheCenterline(cache, key, centerline, context):
+    centerline_layer = QgsVectorLayer(centerline, 'centerline', 'ogr')
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'GPKG'
+    tmp_path = QgsProcessingUtils.generateTempFilename('centerline_cache.gpkg')
+    error = QgsVectorFileWriter.writeAsVectorFormatV2(centerline_layer, tmp_path, context.transformContext(), options)
+    if error[0] == QgsVectorFileWriter.NoError:
+        cache.put(key, tmp_path)
+
+
+# create centerline of a polygon layer in-process, from the Voronoi diagram of its boundary
+def createNativeCenterline(polygon, destination, context, feedback):
+    request = QgsFeatureRequest().setNoAttributes()
+    geometry = QgsGeometry.unaryUnion([f.geometry() for f in polygon.getFeatures(request) if f.hasGeometry()])
+    axis = medial_axis(geometry, feedback=feedback)
+    axis.convertToMultiType()
+    fields = QgsFields()
+    fields.append(QgsField('id', QVariant.Int))
+    sink, dest_id = QgsProcessingUtils.createFeatureSink(destination, context, fields, QgsWkbTypes.MultiLineString, polygon.crs())
+    feature = QgsFeature(fields)
+    feature.setGeometry(axis)
+    feature.setAttributes([1])
+    sink.addFeature(feature, QgsFeatureSink.FastInsert)
+    # deleting sink flushes features to disk
+    del sink
+    return dest_id
+
+
+# create centerline of a polygon with grass voronoi.skeleton algorithm, or with the native Voronoi medial axis
+# centerlines are cached on disk, so that running again on the same polygon is instantaneous
+# returns path of centerline layer
+def createCenterline(polygon, destination, context, feedback, method='grass', smoothness=0.1, thin=-1):
+    # processing is imported when a centerline is created, so that loading the provider doesn't import it
+    import processing
+    # name of algorithm is part of cache key, so that both methods don't share centerlines
+    algorithm = 'grass7:v.voronoi.skeleton' if method == 'grass' else 'rivertools:medialaxis'
+    if isinstance(polygon, str):
+        polygon = QgsProcessingUtils.mapLayerFromString(polygon, context)
+    if not destination:
+        destination = QgsProcessingUtils.generateTempFilename('centerline.gpkg')
+    cache = FileCache(CENTERLINE_CACHE_DIR)
+    if method == 'grass':
+        key = centerlineCacheKey(polygon, algorithm, {'smoothness': smoothness, 'thin': thin})
+    else:
+        key = centerlineCacheKey(polygon, algorithm, {})
+    cached = cache.get(key)
+    # centerline found in cache : copy it to destination
+    if cached is not None:
+        message = 'Centerline found in cache, skipping calculation...'
+        feedback.pushInfo(QCoreApplication.translate('River Tools', message))
+        return copyLayer(QgsVectorLayer(cached, 'centerline', 'ogr'), destination, context)
+    if method == 'native':
+        centerline = createNativeCenterline(polygon, destination, context, feedback)
+        if feedback.isCanceled():
+            return {}
+        cacheCenterline(cache, key, centerline, context)
+        return centerline
+    # voronoi.skeleton parameters
+    skeleton_param = {'input' : polygon,
+              'smoothness' : smoothness,
+              'thin' : thin,
+              'output' : destination} # to output this layer in QGIS as well
+    # run voronoi.skeleton
+    skeleton_result = processing.run(algorithm, skeleton_param, is_child_algorithm=True, context=context, feedback=feedback)
+    # get output
+    centerline = skeleton_result['output']
+    # Check for cancelation
+    if feedback.isCanceled():
+        return {}
+    # save a copy of centerline in cache
+    cacheCenterline(cache, key, centerline, context)
+    # return centerline
+    return centerline
@@ -30,7 +30,8 @@ __copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
 
 __revision__ = '$Format:%H$'
 
-from qgis.PyQt.QtCore import QCoreApplication
+from qgis.PyQt.QtCore import (QCoreApplication,
+                              QVariant)
 from qgis.core import (QgsProcessing,
                        QgsMessageLog,
                        QgsProcessingAlgorithm,
@@ -38,8 +39,24 @@ from qgis.core import (QgsProcessing,
                        QgsProcessingParameterVectorDestination,
                        QgsWkbTypes,
                        QgsProcessingParameterVectorLayer,
+                       QgsProcessingParameterEnum,
+                       QgsProcessingParameterBoolean,
+                       QgsProcessingParameterNumber,
+                       QgsProcessingParameterFileDestination,
+                       QgsProcessingMultiStepFeedback,
+                       QgsProcessingUtils,
+                       QgsFeature,
+                       QgsFeatureRequest,
+                       QgsFeatureSink,
+                       QgsField,
+                       QgsFields,
+                       QgsGeometry,
+                       QgsPointXY,
                        QgsVectorLayer)
-import processing
+from concurrent.futures import ThreadPoolExecutor
+from .river_engine.centerline import medial_axis
+from .river_engine.profiling import StageProfiler
+from .river_tools_utils import CENTERLINE_METHODS, CENTERLINE_METHOD_NAMES, createCenterline, layerFeatureCount, mergedLineParts
 
 
 class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
@@ -64,8 +81,18 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
     CENTERLINE = 'CENTERLINE'
     LENGTH = 'LENGTH'
     WIDTH = 'WIDTH'
+    CENTERLINE_METHOD = 'CENTERLINE_METHOD'
+    IN_MEMORY = 'IN_MEMORY'
+    SEGMENTATION_METHOD = 'SEGMENTATION_METHOD'
+    CHUNK_LENGTH = 'CHUNK_LENGTH'
+    WORKERS = 'WORKERS'
     OUTPUT = 'OUTPUT'
     CENTERLINE_OUTPUT = 'CENTERLINE_OUTPUT'
+    PROFILE = 'PROFILE'
+    
+    # stages of the algorithm, in order, used for progress and profiling
+    STAGES = ['checkTopology', 'createCenterline', 'createParallelBoxes', 'createTransectBoxes', 'createChunkedBoxes',
+              'mergeLines', 'createBuffer', 'createPoints', 'createThiessen', 'clip']
 
     def initAlgorithm(self, config):
         """
@@ -113,6 +140,58 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
             )
         )
 
+        # method used to create centerline if input layer is polygon
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.CENTERLINE_METHOD,
+                self.tr('Method used to create centerline if input layer is polygon'),
+                [self.tr(name) for name in CENTERLINE_METHOD_NAMES],
+                defaultValue = 0
+            )
+        )
+            
+        # method used to cut river into boxes
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.SEGMENTATION_METHOD,
+                self.tr('Method used to create boxes'),
+                [self.tr('Voronoi polygons clipped by river'),
+                 self.tr('Transects perpendicular to centerline (faster on long rivers)')],
+                defaultValue = 0
+            )
+        )
+            
+        # length of windows along centerline for Voronoi boxes, 0 to process whole river at once
+        self.addParameter(
+            QgsProcessingParameterDistance(
+                self.CHUNK_LENGTH,
+                self.tr('Process Voronoi boxes by windows of this length along centerline, 0 to process whole river at once'),
+                0,
+                self.INPUT,
+                minValue = 0
+            )
+        )
+            
+        # number of threads used to process river components in parallel
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.WORKERS,
+                self.tr('Number of parallel workers, to process each river component separately (1 to process whole river at once)'),
+                QgsProcessingParameterNumber.Integer,
+                1,
+                minValue = 1
+            )
+        )
+            
+        # keep intermediate layers in memory instead of temporary files
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.IN_MEMORY,
+                self.tr('Keep intermediate layers in memory (faster, needs more RAM)'),
+                defaultValue = True
+            )
+        )
+            
         # ouput polygon layer
         self.addParameter(
             QgsProcessingParameterVectorDestination(
@@ -131,60 +210,139 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
                 #QgsProcessing.TypeVectorPolygon
             )
         )
+            
+        # optional profile of the algorithm : time, memory and number of features of each stage
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.PROFILE,
+                self.tr('Profile with time and memory of each stage (JSON file)'),
+                self.tr('JSON files (*.json)'),
+                optional=True,
+                createByDefault=False
+            )
+        )
 
     def processAlgorithm(self, parameters, context, feedback):
         """
         Here is where the processing itself takes place.
         """
+        # processing and river_engine modules are imported by the methods using them, when algorithm runs,
+        # so that loading the provider when QGIS starts doesn't import them
         
         # Retrieve inputs
         river = self.parameterAsVectorLayer(parameters, self.INPUT, context)
         centerline = self.parameterAsVectorLayer(parameters, self.CENTERLINE, context)
         length = self.parameterAsInt(parameters, self.LENGTH, context)
         width = self.parameterAsInt(parameters, self.WIDTH, context)
+        # destination for intermediate layers : memory layers, or temporary files
+        if self.parameterAsBool(parameters, self.IN_MEMORY, context):
+            intermediate = 'memory:'
+        else:
+            intermediate = QgsProcessing.TEMPORARY_OUTPUT
+       
+        method = self.parameterAsEnum(parameters, self.SEGMENTATION_METHOD, context)
+        chunk_length = self.parameterAsDouble(parameters, self.CHUNK_LENGTH, context)
+        workers = self.parameterAsInt(parameters, self.WORKERS, context)
+        # progress is reported stage by stage, while stages are timed
+        feedback = QgsProcessingMultiStepFeedback(len(self.STAGES), feedback)
+        profile_path = self.parameterAsFileOutput(parameters, self.PROFILE, context)
+        profiler = StageProfiler(self.STAGES, feedback, trace_memory=bool(profile_path))
+        
+        # process each connected component of river in parallel
+        if workers > 1:
+            if river.geometryType() == QgsWkbTypes.PolygonGeometry:
+                with profiler.stage('checkTopology', layerFeatureCount(river)):
+                    river = self.checkTopology(river, intermediate, context, feedback)
+                # checkTopology returns an empty dict if geometries couldn't be fixed
+                if not isinstance(river, QgsVectorLayer):
+                    return {}
+            else:
+                centerline = river
+            with profiler.stage('createParallelBoxes', layerFeatureCount(river)):
+                boxes = self.createParallelBoxes(river, centerline, length, width, method, chunk_length, workers, parameters, context, feedback)
+            if feedback.isCanceled() or not boxes:
+                return {}
+            results = {self.OUTPUT:boxes['OUTPUT']}
+            if 'CENTERLINE' in boxes:
+                results[self.CENTERLINE_OUTPUT] = boxes['CENTERLINE']
+            return self.finish(results, profiler, parameters, context, feedback)
        
         # if input layer is polygon and no centerline provided
         if river.geometryType() == QgsWkbTypes.PolygonGeometry and not centerline:
             # check topology
-            river = self.checkTopology(river, context, feedback)
+            with profiler.stage('checkTopology', layerFeatureCount(river)):
+                river = self.checkTopology(river, intermediate, context, feedback)
+            if not isinstance(river, QgsVectorLayer):
+                return {}
             # calculate the centerline for the input layer       
-            centerline_output = self.createCenterline(river, parameters, context, feedback)
+            with profiler.stage('createCenterline'):
+                centerline_output = self.createCenterline(river, parameters, context, feedback)
             centerline = centerline_output['output']
         # if input layer is line, it is considered as centerline
         if river.geometryType() == QgsWkbTypes.LineGeometry:
             centerline = river
             
+        # cut river directly with transects along centerline, without Voronoi polygons
+        # or create Voronoi boxes window by window if a window length is given
+        if method == 1 or chunk_length > 0:
+            if method == 1:
+                with profiler.stage('createTransectBoxes'):
+                    boxes = self.createTransectBoxes(river, centerline, length, width, parameters, context, feedback)
+            else:
+                with profiler.stage('createChunkedBoxes'):
+                    boxes = self.createChunkedBoxes(river, centerline, length, width, chunk_length, parameters, context, feedback)
+            if feedback.isCanceled():
+                return {}
+            try:
+                return self.finish({self.OUTPUT:boxes['OUTPUT'], self.CENTERLINE_OUTPUT:centerline_output['output']}, profiler, parameters, context, feedback)
+            except NameError:
+                return self.finish({self.OUTPUT:boxes['OUTPUT']}, profiler, parameters, context, feedback)
+            
         # if no polygon layer provided
         if river.geometryType() == QgsWkbTypes.LineGeometry:
             # if centerline is composed of multiple lines, merge them
-            features = centerline.getFeatures()
-            nb_features = sum(1 for _ in features)
+            nb_features = layerFeatureCount(centerline)
             if nb_features > 1:
-                centerline = self.mergeLines(centerline, context, feedback)
+                with profiler.stage('mergeLines', nb_features):
+                    centerline = self.mergeLines(centerline, intermediate, context, feedback)
             # create buffer layer around centerline
-            buffer_layer = self.createBuffer(centerline, width, context, feedback)
+            with profiler.stage('createBuffer'):
+                buffer_layer = self.createBuffer(centerline, width, intermediate, context, feedback)
               
         # create points along centerline at a given interval
-        points_layer = self.createPoints(centerline, length, context, feedback)
+        with profiler.stage('createPoints'):
+            points_layer = self.createPoints(centerline, length, intermediate, context, feedback)
         
         # create Thiessen polygons
-        thiessen_layer = self.createThiessen(points_layer, context, feedback)
+        with profiler.stage('createThiessen'):
+            thiessen_layer = self.createThiessen(points_layer, intermediate, context, feedback)
         
         # if polygon layer is provided, clip thiessen by polygon
-        if river.geometryType() == QgsWkbTypes.PolygonGeometry:
-            boxes = self.clip(thiessen_layer, river, parameters, context, feedback)
-        # else, clip by buffer layer
-        else:
-            boxes = self.clip(thiessen_layer, buffer_layer, parameters, context, feedback)
+        with profiler.stage('clip'):
+            if river.geometryType() == QgsWkbTypes.PolygonGeometry:
+                boxes = self.clip(thiessen_layer, river, parameters, context, feedback)
+            # else, clip by buffer layer
+            else:
+                boxes = self.clip(thiessen_layer, buffer_layer, parameters, context, feedback)
 
 
         # Return the results of the algorithm : segmentation boxes layer, centerline layer if wanted
         try:
-            return {self.OUTPUT:boxes['OUTPUT'], self.CENTERLINE_OUTPUT:centerline_output['output']}
+            return self.finish({self.OUTPUT:boxes['OUTPUT'], self.CENTERLINE_OUTPUT:centerline_output['output']}, profiler, parameters, context, feedback)
         except NameError:
-            return {self.OUTPUT:boxes['OUTPUT']}
+            return self.finish({self.OUTPUT:boxes['OUTPUT']}, profiler, parameters, context, feedback)
         
-    def checkTopology(self, river, context, feedback):
+    # save profile of stages if asked, and return results of algorithm
+    def finish(self, results, profiler, parameters, context, feedback):
+        feedback.setCurrentStep(len(self.STAGES))
+        profile_path = self.parameterAsFileOutput(parameters, self.PROFILE, context)
+        if profile_path:
+            profiler.write(profile_path)
+            results[self.PROFILE] = profile_path
+        return results
+    
+    def checkTopology(self, river, output, context, feedback):
+        import processing
         message = 'Checking topology for river layer...'
         feedback.pushInfo(QCoreApplication.translate('Segmentation Boxes', message))
         invalid = False
@@ -208,14 +366,14 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
                       'JOIN_STYLE' : 0, #  0 : round, 1 : square angle, 2 : oblique
                       'MITER_LIMIT' : 2,
                       'DISSOLVE' : False,
-                      'OUTPUT' : 'buffer'}
+                      'OUTPUT' : output}
             buffer_result = processing.run("native:buffer", buffer_param, is_child_algorithm=True, context=context, feedback=feedback)
             river = buffer_result['OUTPUT']
             if feedback.isCanceled():
                 return {}
             
             # check validity again
-            river = QgsVectorLayer(river, "river", "ogr")
+            river = QgsProcessingUtils.mapLayerFromString(river, context)
             for feature in river.getFeatures():
                 geom = feature.geometry()
                 # if an invalid geometry is encountered again, exit with error message
@@ -230,30 +388,28 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
         return river
     
     def createCenterline(self, polygon, parameters, context, feedback):
-        message = 'Creating  centerline with grass voronoi.skeleton algorithm...'
+        method_index = self.parameterAsEnum(parameters, self.CENTERLINE_METHOD, context)
+        message = f'Creating centerline with {CENTERLINE_METHOD_NAMES[method_index]}...'
         feedback.pushInfo(QCoreApplication.translate('Segmentation Boxes', message))
-        # voronoi.skeleton parameters
-        skeleton_param = {'input' : polygon,
-                  'smoothness' : 0.1,
-                  'thin' : -1,
-                  'output' : parameters[self.CENTERLINE_OUTPUT]} # to output this layer in QGIS as well
-        # run voronoi.skeleton
-        skeleton_result = processing.run("grass7:v.voronoi.skeleton", skeleton_param, is_child_algorithm=True, context=context, feedback=feedback)
-        #centerline = skeleton_result['output']
+        # run voronoi.skeleton or native medial axis, or get centerline from cache
+        destination = self.parameterAsOutputLayer(parameters, self.CENTERLINE_OUTPUT, context)
+        method = CENTERLINE_METHODS[method_index]
+        centerline = createCenterline(polygon, destination, context, feedback, method)
         # Check for cancelation
         if feedback.isCanceled():
             return {}
         # return centerline
-        return skeleton_result
+        return {'output': centerline}
     
-    def mergeLines(self, line, context, feedback):
+    def mergeLines(self, line, output, context, feedback):
+        import processing
         message = 'Grouping lines with dissolve algorithm...'
         feedback.pushInfo(QCoreApplication.translate('Segmentation Boxes', message))
         # dissolve parameters
         dissolve_param = {'INPUT' : line,
                   'FIELD' : None,
                   #'OUTPUT' : parameters[self.OUTPUT]} # to output this layer in QGIS as well
-                  'OUTPUT' : 'dissolve'}
+                  'OUTPUT' : output}
         # run dissolve
         dissolve_result = processing.run("native:dissolve", dissolve_param, is_child_algorithm=True, context=context, feedback=feedback)
         dissolve_layer = dissolve_result['OUTPUT']
@@ -263,7 +419,8 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
         # return dissolved layer
         return dissolve_layer
     
-    def createBuffer(self, line, width, context, feedback):
+    def createBuffer(self, line, width, output, context, feedback):
+        import processing
         message = 'Creating buffer with buffer algorithm...'
         feedback.pushInfo(QCoreApplication.translate('Segmentation Boxes', message))
         # buffer parameters
@@ -275,7 +432,7 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
                   'MITER_LIMIT' : 2,
                   'DISSOLVE' : True,
                   #'OUTPUT' : parameters[self.OUTPUT]} # to output this layer in QGIS as well
-                  'OUTPUT' : 'buffer'}
+                  'OUTPUT' : output}
         # run buffer
         buffer_result = processing.run("native:buffer", buffer_param, is_child_algorithm=True, context=context, feedback=feedback)
         buffer_layer = buffer_result['OUTPUT']
@@ -285,7 +442,8 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
         # return buffered layer
         return buffer_layer
     
-    def createPoints(self, line, length, context, feedback):
+    def createPoints(self, line, length, output, context, feedback):
+        import processing
         message = 'Creating points along lines with pointsalonglines algorithm...'
         feedback.pushInfo(QCoreApplication.translate('Segmentation Boxes', message))
         # pointsalonglines parameters
@@ -294,7 +452,7 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
                   'START_OFFSET' : length/2,
                   'END_OFFSET' : 0,
                   #'OUTPUT' : parameters[self.OUTPUT]} # to output this layer in QGIS as well
-                  'OUTPUT' : 'points along lines'}
+                  'OUTPUT' : output}
         # run pointsalonglines
         points_result = processing.run("native:pointsalonglines", pointsalonglines_param, is_child_algorithm=True, context=context, feedback=feedback)
         points_layer = points_result['OUTPUT']
@@ -304,14 +462,15 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
         # return point layer
         return points_layer
     
-    def createThiessen(self, points, context, feedback):
+    def createThiessen(self, points, output, context, feedback):
+        import processing
         message = 'Creating Thiessen polygons with QGIS voronoipolygons algorithm...'
         feedback.pushInfo(QCoreApplication.translate('Segmentation Boxes', message))
         # thiessen parameters
         thiessen_param = {'INPUT' : points,
                   'BUFFER' : 10,
                   #'OUTPUT' : parameters[self.OUTPUT]} # to output this layer in QGIS as well
-                  'OUTPUT' : 'thiessen'}
+                  'OUTPUT' : output}
         # run voronoipolygons algorithm
         thiessen_results = processing.run("qgis:voronoipolygons", thiessen_param, is_child_algorithm=True, context=context, feedback=feedback)
         thiessen_layer = thiessen_results['OUTPUT']
@@ -322,6 +481,7 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
         return thiessen_layer
     
     def clip(self, toclip, mask, parameters, context, feedback):
+        import processing
         message = 'Clipping Thiessen Polygons with clip algorithm...'
         feedback.pushInfo(QCoreApplication.translate('Segmentation Boxes', message))
         # thiessen parameters
@@ -336,6 +496,141 @@ class SegmentationBoxesAlgorithm(QgsProcessingAlgorithm):
         # return segmentation boxes layer
         return clip_results
 
+    # returns centerline layer, river polygon geometries (empty list if river is a line) and merged centerline parts
+    def riverGeometries(self, river, centerline, context):
+        if isinstance(centerline, str):
+            centerline = QgsProcessingUtils.mapLayerFromString(centerline, context)
+        parts = mergedLineParts(centerline)
+        polygons = []
+        if river.geometryType() == QgsWkbTypes.PolygonGeometry:
+            request = QgsFeatureRequest().setNoAttributes()
+            polygons = [f.geometry() for f in river.getFeatures(request) if f.hasGeometry()]
+        return centerline, polygons, parts
+    
+    # write boxes, as returned by river_engine.boxes functions, to output layer
+    # fields are centerline fields, plus distance along centerline and angle of box middle, as points along lines
+    def writeBoxes(self, boxes, centerline_fields, attributes, crs, parameters, context):
+        fields = QgsFields(centerline_fields)
+        fields.append(QgsField('distance', QVariant.Double))
+        fields.append(QgsField('angle', QVariant.Double))
+        destination = self.parameterAsOutputLayer(parameters, self.OUTPUT, context)
+        sink, dest_id = QgsProcessingUtils.createFeatureSink(destination, context, fields, QgsWkbTypes.MultiPolygon, crs)
+        for distance, angle, box in boxes:
+            feature = QgsFeature(fields)
+            feature.setGeometry(box)
+            feature.setAttributes(attributes + [distance, angle])
+            sink.addFeature(feature, QgsFeatureSink.FastInsert)
+        # deleting sink flushes features to disk
+        del sink
+        return {'OUTPUT': dest_id}
+    
+    # attributes of first centerline feature, copied to boxes as dissolve + points along lines would do
+    def centerlineAttributes(self, centerline):
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setLimit(1)
+        first = next(centerline.getFeatures(request), None)
+        return first.attributes() if first is not None else [None] * centerline.fields().count()
+    
+    def createTransectBoxes(self, river, centerline, length, width, parameters, context, feedback):
+        from .river_engine.api import segment
+        message = 'Cutting river with transects perpendicular to centerline...'
+        feedback.pushInfo(QCoreApplication.translate('Segmentation Boxes', message))
+        centerline, polygons, parts = self.riverGeometries(river, centerline, context)
+        boxes = segment(polygons, parts, length, width, 'transect', feedback=feedback)
+        if feedback.isCanceled():
+            return {}
+        return self.writeBoxes(boxes, centerline.fields(), self.centerlineAttributes(centerline), centerline.crs(), parameters, context)
+    
+    # same boxes as points along lines + Voronoi polygons + clip, but calculated window by window along centerline,
+    # so that memory does not grow with river length
+    def createChunkedBoxes(self, river, centerline, length, width, chunk_length, parameters, context, feedback):
+        from .river_engine.api import segment
+        message = 'Creating Voronoi boxes window by window along centerline...'
+        feedback.pushInfo(QCoreApplication.translate('Segmentation Boxes', message))
+        centerline, polygons, parts = self.riverGeometries(river, centerline, context)
+        boxes = segment(polygons, parts, length, width, 'voronoi', chunk_length, feedback)
+        if feedback.isCanceled():
+            return {}
+        return self.writeBoxes(boxes, centerline.fields(), self.centerlineAttributes(centerline), centerline.crs(), parameters, context)
+    
+    # split river into connected components, and create boxes of each component in a pool of threads
+    # all components are cut along the whole centerline, and pieces of a box in several components are merged,
+    # so that boxes are the same as when processing whole river at once
+    # processing.run can't be called from threads, so components without centerline get a native medial axis
+    # returns boxes layer, and centerline layer if it was created and asked for
+    def createParallelBoxes(self, river, centerline, length, width, method, chunk_length, workers, parameters, context, feedback):
+        from .river_engine.api import SEGMENTATION_METHODS, segment
+        message = f'Creating boxes of each river component with {workers} workers...'
+        feedback.pushInfo(QCoreApplication.translate('Segmentation Boxes', message))
+        request = QgsFeatureRequest().setNoAttributes()
+        if isinstance(centerline, str):
+            centerline = QgsProcessingUtils.mapLayerFromString(centerline, context)
+        # connected components : parts of dissolved polygons, or buffers of merged lines as river_mask would do
+        if river.geometryType() == QgsWkbTypes.PolygonGeometry:
+            polygons = QgsGeometry.unaryUnion([f.geometry() for f in river.getFeatures(request) if f.hasGeometry()])
+            components = polygons.asGeometryCollection()
+        else:
+            parts = mergedLineParts(river)
+            components = [QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for x, y in part]).buffer(width, 5) for part in parts]
+        
+        # centerline of one polygon component, run in a worker thread
+        def componentAxis(component):
+            if feedback.isCanceled():
+                return []
+            axis = medial_axis(component)
+            axis_parts = [[(pt.x(), pt.y()) for pt in g.asPolyline()] for g in axis.asGeometryCollection()
+                          if g.type() == QgsWkbTypes.LineGeometry]
+            return [part for part in axis_parts if len(part) > 1]
+        
+        created = False
+        if river.geometryType() == QgsWkbTypes.PolygonGeometry:
+            if centerline:
+                parts = mergedLineParts(centerline)
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    parts = [part for axis_parts in executor.map(componentAxis, components) for part in axis_parts]
+                created = True
+        if feedback.isCanceled():
+            return {}
+        
+        # boxes of the whole centerline clipped by one component, run in a worker thread
+        def segmentComponent(component):
+            if feedback.isCanceled():
+                return []
+            return segment([component], parts, length, width, SEGMENTATION_METHODS[method], chunk_length, feedback)
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(segmentComponent, components))
+        if feedback.isCanceled():
+            return {}
+        # merge pieces of boxes crossing several components, a box being identified by its distance along centerline
+        pieces = {}
+        for component_boxes in results:
+            for distance, angle, box in component_boxes:
+                pieces.setdefault(distance, (angle, []))[1].append(box)
+        boxes = [(distance, angle, geometries[0] if len(geometries) == 1 else QgsGeometry.unaryUnion(geometries))
+                 for distance, (angle, geometries) in sorted(pieces.items())]
+        if centerline:
+            results = self.writeBoxes(boxes, centerline.fields(), self.centerlineAttributes(centerline), river.crs(), parameters, context)
+        else:
+            results = self.writeBoxes(boxes, QgsFields(), [], river.crs(), parameters, context)
+        # created centerline is written to centerline output, as createCenterline does
+        if created:
+            destination = self.parameterAsOutputLayer(parameters, self.CENTERLINE_OUTPUT, context)
+            if destination:
+                results['CENTERLINE'] = self.writeLines(parts, river.crs(), destination, context)
+        return results
+    
+    # write centerline parts, as lists of (x, y) tuples, to a line layer without attributes
+    def writeLines(self, parts, crs, destination, context):
+        sink, dest_id = QgsProcessingUtils.createFeatureSink(destination, context, QgsFields(), QgsWkbTypes.LineString, crs)
+        for part in parts:
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for x, y in part]))
+            sink.addFeature(feature, QgsFeatureSink.FastInsert)
+        # deleting sink flushes features to disk
+        del sink
+        return dest_id
+
     def name(self):
         """
         Returns the algorithm name, used for identifying the algorithm. This
@@ -0,0 +1,207 @@
+# coding=utf-8
+"""Benchmarks of River Tools stages on synthetic rivers.
+
+Synthetic sinuous rivers and point sets of configurable size are generated,
+each stage of Distance along river and Segmentation boxes is run on them and
+its wall time and peak memory are written as JSON, for regression tracking.
+
+Run from plugin directory, e.g. :
+
+    PYTHONPATH=. python test/benchmark.py --points 100000 --output benchmark.json
+
+Stages using QGIS geometries (centerline, merge, voronoi_boxes, transect_boxes)
+are skipped when qgis can't be imported, and the default Processing chain of
+Segmentation boxes (points along lines, Voronoi polygons, clip) when the
+Processing framework can't be initialized.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from river_engine.distances import vincenty_distance
+from river_engine.linear_referencing import Centerline, chainage_distance
+from river_engine.segmentation import box_rings
+
+try:
+    from qgis.core import QgsGeometry, QgsPointXY
+    HAS_QGIS = True
+except ImportError:
+    HAS_QGIS = False
+# QGIS application running Processing algorithms, kept alive until the end of benchmark
+QGIS_APP = None
+
+
+def sinuous_centerline(length, wavelength=1000., amplitude=200., spacing=10.):
+    """Vertices of a meandering river centerline, as a (n, 2) array."""
+    x = np.arange(0., length + spacing, spacing)
+    y = amplitude * np.sin(2 * np.pi * x / wavelength)
+    return np.column_stack((x, y))
+
+
+def river_banks(centerline, width):
+    """Closed ring of a river polygon of given width around centerline."""
+    delta = np.gradient(centerline, axis=0)
+    normals = np.column_stack((-delta[:, 1], delta[:, 0]))
+    normals /= np.hypot(normals[:, 0], normals[:, 1])[:, None]
+    left = centerline + width / 2 * normals
+    right = centerline - width / 2 * normals
+    return np.vstack((left, right[::-1], left[:1]))
+
+
+def random_points(centerline, count, width, seed=0):
+    """Points scattered along centerline, at most width / 2 away from it."""
+    random = np.random.default_rng(seed)
+    segment = random.integers(0, len(centerline) - 1, count)
+    t = random.random(count)
+    start, end = centerline[segment], centerline[segment + 1]
+    points = start + t[:, None] * (end - start)
+    return points + random.uniform(-width / 2, width / 2, (count, 2))
+
+
+def measure(stage, size, function, repeat):
+    """Best wall time and peak traced memory of function over repeat runs."""
+    seconds = []
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {'stage': stage,
+            'size': size,
+            'seconds': min(seconds),
+            'peak_memory_mb': peak / 1024 ** 2}
+
+
+def polyline(coords):
+    """QGIS line geometry from a (n, 2) array."""
+    return QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for x, y in coords])
+
+
+def start_processing():
+    """Start a QGIS application with Processing algorithms, False if it can't be started."""
+    try:
+        from qgis.analysis import QgsNativeAlgorithms
+        from qgis.core import QgsApplication
+        from processing.core.Processing import Processing
+    except ImportError:
+        return False
+    global QGIS_APP
+    QGIS_APP = QgsApplication([], False)
+    QGIS_APP.initQgis()
+    Processing.initialize()
+    QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+    return True
+
+
+def memory_layer(geometry_type, geometries):
+    """Memory layer without attributes holding geometries."""
+    from qgis.core import QgsFeature, QgsVectorLayer
+    layer = QgsVectorLayer(f'{geometry_type}?crs=EPSG:2154', geometry_type, 'memory')
+    features = []
+    for geometry in geometries:
+        feature = QgsFeature()
+        feature.setGeometry(geometry)
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+def processing_chain(line, polygon, box_length):
+    """Default Segmentation boxes chain : points along lines, Voronoi polygons, clip."""
+    import processing
+    points = processing.run('native:pointsalonglines', {'INPUT': line, 'DISTANCE': box_length,
+                                                        'START_OFFSET': box_length / 2, 'END_OFFSET': 0,
+                                                        'OUTPUT': 'memory:'})['OUTPUT']
+    thiessen = processing.run('qgis:voronoipolygons', {'INPUT': points, 'BUFFER': 10, 'OUTPUT': 'memory:'})['OUTPUT']
+    return processing.run('native:clip', {'INPUT': thiessen, 'OVERLAY': polygon, 'OUTPUT': 'memory:'})['OUTPUT']
+
+
+def run(river_length, point_count, width, box_length, repeat):
+    """Run all stages, returns a list of results."""
+    axis = sinuous_centerline(river_length)
+    points1 = random_points(axis, point_count, width, seed=1)
+    points2 = random_points(axis, point_count, width, seed=2)
+    centerline = Centerline([axis])
+    results = []
+    # Distance along river stages
+    projections = {}
+
+    def projection():
+        projections[1] = Centerline([axis]).project(points1[:, 0], points1[:, 1])
+        projections[2] = Centerline([axis]).project(points2[:, 0], points2[:, 1])
+    results.append(measure('projection', point_count, projection, repeat))
+
+    def distance():
+        # points around 0 degree longitude, 45 degree latitude for ellipsoidal distances
+        vincenty_distance(points1[:, 0] / 1e5, 45 + points1[:, 1] / 1e5, points2[:, 0] / 1e5, 45 + points2[:, 1] / 1e5)
+        chainage_distance(projections[1]['chainage'], projections[2]['chainage'])
+    results.append(measure('distance', point_count, distance, repeat))
+    # Segmentation boxes stages
+    results.append(measure('transects', centerline.segment_count,
+                           lambda: box_rings(axis, box_length, width), repeat))
+    if not HAS_QGIS:
+        return results
+    from river_engine.boxes import transect_boxes, voronoi_boxes
+    from river_engine.centerline import medial_axis
+    polygon = QgsGeometry.fromPolygonXY([[QgsPointXY(x, y) for x, y in river_banks(axis, width)]])
+    results.append(measure('centerline', centerline.segment_count, lambda: medial_axis(polygon), repeat))
+    # river line cut in pieces of 10 vertices, as a river layer with many features
+    pieces = [polyline(axis[i:i + 10]) for i in range(0, len(axis) - 1, 9)]
+    results.append(measure('merge', len(pieces), lambda: QgsGeometry.collectGeometry(pieces).mergeLines(), repeat))
+    results.append(measure('voronoi_boxes', centerline.segment_count,
+                           lambda: voronoi_boxes(polygon, [axis.tolist()], box_length), repeat))
+    results.append(measure('transect_boxes', centerline.segment_count,
+                           lambda: transect_boxes(polygon, [axis.tolist()], box_length), repeat))
+    if not start_processing():
+        return results
+    line_layer = memory_layer('LineString', [polyline(axis)])
+    polygon_layer = memory_layer('Polygon', [polygon])
+    results.append(measure('points_voronoi_clip', centerline.segment_count,
+                           lambda: processing_chain(line_layer, polygon_layer, box_length), repeat))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--river-length', type=float, default=100000., help='length of synthetic river')
+    parser.add_argument('--points', type=int, default=10000, help='number of points in each point layer')
+    parser.add_argument('--width', type=float, default=50., help='width of synthetic river')
+    parser.add_argument('--box-length', type=float, default=100., help='length of segmentation boxes')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs of each stage, best time is kept')
+    parser.add_argument('--output', help='JSON file where results are written, printed if not set')
+    args = parser.parse_args(argv)
+    report = {'python': platform.python_version(),
+              'numpy': np.__version__,
+              'qgis': HAS_QGIS,
+              'river_length': args.river_length,
+              'points': args.points,
+              'results': run(args.river_length, args.points, args.width, args.box_length, args.repeat)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
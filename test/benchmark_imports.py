@@ -0,0 +1,98 @@
+# coding=utf-8
+"""Benchmark of the import time of River Tools modules.
+
+Each module is imported in a fresh Python process, its import time is
+measured and heavy modules (numpy, pandas, processing, pyarrow) it pulled
+in are listed, so that provider startup can be checked not to import them.
+Results are written as JSON.
+
+Run from plugin directory, e.g. :
+
+    python test/benchmark_imports.py --output benchmark_imports.json
+
+Plugin modules (provider and algorithms) are skipped when qgis can't be
+imported.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+# modules which should not be imported when QGIS loads the provider
+HEAVY_MODULES = ['numpy', 'pandas', 'processing', 'pyarrow']
+
+# code run in a fresh process : import module, print import time and heavy modules loaded
+IMPORT_CODE = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module({module!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'heavy_modules': [name for name in {heavy!r} if name in sys.modules]}}))
+'''
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def has_qgis():
+    """True if qgis can be imported."""
+    return subprocess.run([sys.executable, '-c', 'import qgis.core'], capture_output=True).returncode == 0
+
+
+def measure(module, path, repeat):
+    """Best import time of module over repeat fresh processes, and heavy modules it imported."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [path, os.environ.get('PYTHONPATH')])))
+    code = IMPORT_CODE.format(module=module, heavy=HEAVY_MODULES)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(runs, key=lambda r: r['seconds'])
+    return {'module': module, 'seconds': best['seconds'], 'heavy_modules': best['heavy_modules']}
+
+
+def run(repeat):
+    """Measure reference modules, engines, and plugin modules if qgis is available."""
+    results = [measure(module, PLUGIN_DIR, repeat) for module in ('numpy', 'pandas', 'river_engine.api')]
+    if not has_qgis():
+        return results
+    # plugin modules use relative imports, they are imported as modules of plugin package
+    package = os.path.basename(PLUGIN_DIR)
+    for module in ('river_tools_processing_provider',
+                   'segmentation_boxes_processing_algorithm',
+                   'distance_along_river_processing_algorithm',
+                   'distance_along_river_batch_processing_algorithm'):
+        results.append(measure(f'{package}.{module}', os.path.dirname(PLUGIN_DIR), repeat))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5, help='number of imports of each module, best time is kept')
+    parser.add_argument('--output', help='JSON file where results are written, printed if not set')
+    args = parser.parse_args(argv)
+    report = {'python': platform.python_version(),
+              'qgis': has_qgis(),
+              'results': run(args.repeat)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# coding=utf-8
+"""Tests for the headless API working on arrays.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import math
+import unittest
+
+import pandas as pd
+
+from river_engine.api import distance_matrix, flow_sides, load_centerline, locate_outlet, pair_distances, project
+from river_engine.network import RiverNetwork
+
+
+class ApiTest(unittest.TestCase):
+    """Test distances between points from arrays, without QGIS."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.centerline = load_centerline([[(0, 0), (100, 0)]])
+        result1 = project(self.centerline, [10, 50, 90], [5, 5, 5])
+        result2 = project(self.centerline, [20, 70], [-5, 0])
+        self.points1 = (['a', 'b', 'c'], [10., 50., 90.], [5., 5., 5.], result1['chainage'], result1['segment'])
+        self.points2 = (['a', 'b'], [20., 70.], [-5., 0.], result2['chainage'], result2['segment'])
+
+    def test_load_centerline(self):
+        """Test a network is loaded when asked."""
+        self.assertNotIsInstance(self.centerline, RiverNetwork)
+        self.assertIsInstance(load_centerline([[(0, 0), (10, 0)]], network=True), RiverNetwork)
+
+    def test_pair_distances(self):
+        """Test points with the same id are paired, missing points get NaN distances."""
+        df = pair_distances(self.points1, self.points2, self.centerline)
+        self.assertEqual(list(df.columns), ['ID1', 'ID2', 'straight_dist', 'river_dist'])
+        self.assertEqual(list(df['ID1']), ['a', 'b', 'c'])
+        self.assertEqual(list(df['ID2']), ['a', 'b', None])
+        self.assertAlmostEqual(df['straight_dist'][0], math.hypot(10, 10))
+        self.assertEqual(list(df['river_dist'][:2]), [10., 20.])
+        self.assertTrue(math.isnan(df['straight_dist'][2]))
+        self.assertTrue(math.isnan(df['river_dist'][2]))
+
+    def test_duplicated_ids(self):
+        """Test the last point is kept when an id is duplicated."""
+        points2 = (['a', 'a'], [20., 60.], [0., 0.], [20., 60.], [0., 0.])
+        df = pair_distances(self.points1, points2, self.centerline)
+        self.assertEqual(df['river_dist'][0], 50.)
+
+    def test_null_ids(self):
+        """Test points without id are not paired, and ids of any type are paired."""
+        points1 = (['a', None, 1], [10., 50., 90.], [5., 5., 5.], [10., 50., 90.], [0., 0., 0.])
+        points2 = ([1, None, 'a'], [20., 70., 80.], [0., 0., 0.], [20., 70., 80.], [0., 0., 0.])
+        df = pair_distances(points1, points2, self.centerline)
+        self.assertEqual(sorted(df['ID1'][:2], key=str), [1, 'a'])
+        self.assertEqual(list(df['ID1'][:2]), list(df['ID2'][:2]))
+        self.assertEqual(list(df['ID1'][2:]), [None, None])
+        self.assertEqual(list(df['ID2'][2:]), [None, None])
+        self.assertEqual(list(df['river_dist'][:2]), [70., 70.])
+        self.assertTrue(df['river_dist'][2:].isna().all())
+
+    def test_distance_matrix(self):
+        """Test all pairs are calculated, and pairs too far along river are left out."""
+        blocks = list(distance_matrix(self.points1, self.points2, self.centerline))
+        df = pd.concat([df for _, df in blocks])
+        self.assertEqual(len(df), 6)
+        self.assertEqual(blocks[-1][0], 1.)
+        df = pd.concat([df for _, df in distance_matrix(self.points1, self.points2, self.centerline, max_river_distance=25)])
+        self.assertEqual(list(zip(df['ID1'], df['ID2'])), [('a', 'a'), ('b', 'b'), ('c', 'b')])
+
+    def test_matrix_ids(self):
+        """Test points with a duplicated or NULL id all have rows in the matrix."""
+        points1 = ([None, None, None], [10., 50., 90.], [5., 5., 5.], [10., 50., 90.], [0., 0., 0.])
+        df = pd.concat([df for _, df in distance_matrix(points1, self.points2, self.centerline)])
+        self.assertEqual(len(df), 6)
+        self.assertEqual(sorted(df['river_dist']), [10., 20., 20., 30., 60., 70.])
+
+    def test_multipart(self):
+        """Test distances between points on different parts of a centerline are NaN."""
+        centerline = load_centerline([[(0, 0), (100, 0)], [(200, 0), (300, 0)]])
+        result = project(centerline, [10, 50, 250], [0, 0, 0])
+        points = (['a', 'b', 'c'], [10., 50., 250.], [0., 0., 0.], result['chainage'], result['segment'])
+        df = pair_distances(points, points, centerline)
+        self.assertEqual(list(df['river_dist']), [0., 0., 0.])
+        df = pd.concat([df for _, df in distance_matrix(points, points, centerline)])
+        self.assertEqual(int(df['river_dist'].isna().sum()), 4)
+        df = pd.concat([df for _, df in distance_matrix(points, points, centerline, max_river_distance=1000)])
+        self.assertEqual(list(zip(df['ID1'], df['ID2'])), [('a', 'a'), ('a', 'b'), ('b', 'a'), ('b', 'b'), ('c', 'c')])
+
+    def test_flow_direction(self):
+        """Test distances are signed by flow direction and rows sorted from upstream to downstream."""
+        # centerline drawn downstream : point 2 of a and b is downstream of point 1
+        df = pair_distances(self.points1, self.points2, self.centerline, flow=True)
+        self.assertEqual(list(df['river_dist'][:2]), [10., 20.])
+        # outlet at the start of centerline : rows go from c to a, point 2 of a and b is upstream
+        df = pair_distances(self.points1, self.points2, self.centerline, flow=True, outlet=0.)
+        self.assertEqual(list(df['ID1']), ['c', 'b', 'a'])
+        self.assertEqual(list(df['river_dist'][1:]), [-20., -10.])
+        df = pd.concat([df for _, df in distance_matrix(self.points1, self.points2, self.centerline,
+                                                         flow=True, outlet=0.)])
+        self.assertEqual(list(df['ID1']), ['c', 'c', 'b', 'b', 'a', 'a'])
+        self.assertEqual(list(df['river_dist']), [70., 20., 30., -20., -10., -60.])
+
+    def test_flow_sides(self):
+        """Test banks are given relative to flow, which goes against lines direction upstream of outlet."""
+        result = flow_sides(self.centerline, project(self.centerline, [10, 90], [5, 5]), outlet=50.)
+        self.assertEqual(list(result['side']), [1, -1])
+        self.assertEqual(list(result['offset']), [5, -5])
+        # in a network, flow in the tributary drawn away from the confluence goes against its direction
+        network = load_centerline([[(0, 0), (10, 0), (20, 0)], [(10, 0), (10, 10)]], network=True)
+        result = flow_sides(network, project(network, [15, 11], [1, 5]), locate_outlet(network, 20, 0))
+        self.assertEqual(list(result['side']), [1, 1])
+
+    def test_network_flow_direction(self):
+        """Test flow direction in a network goes towards its outlet."""
+        # river going east from (0, 0) to (20, 0), with a tributary coming from (10, 10)
+        network = load_centerline([[(0, 0), (10, 0), (20, 0)], [(10, 10), (10, 0)]], network=True)
+        outlet = locate_outlet(network, 20, 0)
+        result1 = project(network, [10, 4], [5, 0])
+        result2 = project(network, [15, 15], [0, 0])
+        df = pair_distances((['a', 'b'], [10., 4.], [5., 0.], result1['chainage'], result1['segment']),
+                            (['a', 'b'], [15., 15.], [0., 0.], result2['chainage'], result2['segment']),
+                            network, flow=True, outlet=outlet)
+        # b is further from outlet than a
+        self.assertEqual(list(df['ID1']), ['b', 'a'])
+        self.assertEqual(list(df['river_dist']), [11., 10.])
+        df = pair_distances((['a'], [15.], [0.], result2['chainage'][:1], result2['segment'][:1]),
+                            (['a'], [10.], [5.], result1['chainage'][:1], result1['segment'][:1]),
+                            network, flow=True, outlet=outlet)
+        self.assertEqual(list(df['river_dist']), [-10.])
+
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ApiTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
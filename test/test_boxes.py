@@ -0,0 +1,70 @@
+# coding=utf-8
+"""Tests for segmentation boxes geometries.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import unittest
+
+from qgis.core import QgsGeometry
+
+from river_engine.boxes import river_mask, transect_boxes, voronoi_boxes
+
+
+class BoxesTest(unittest.TestCase):
+    """Test boxes cover the river without overlapping."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # straight river whose length is not a multiple of box length
+        self.polygon = QgsGeometry.fromWkt('POLYGON((0 0, 340 0, 340 20, 0 20, 0 0))')
+        self.parts = [[(0, 10), (340, 10)]]
+        # meandering river, as a buffer around its centerline
+        self.meander_parts = [[(0, 0), (100, 0), (100, 40), (0, 40), (0, 80), (100, 80)]]
+        self.meander = river_mask([], self.meander_parts, 8)
+
+    def assertCovers(self, boxes, polygon):
+        """Check union of boxes is the polygon, and boxes don't overlap."""
+        geometries = [box for _, _, box in boxes]
+        union = QgsGeometry.unaryUnion(geometries)
+        self.assertLess(polygon.symDifference(union).area(), 1e-6 * polygon.area())
+        self.assertAlmostEqual(sum(box.area() for box in geometries), polygon.area(), delta=1e-6 * polygon.area())
+
+    def assertSameBoxes(self, boxes, expected):
+        """Check boxes have the same distances and geometries."""
+        self.assertEqual([distance for distance, _, _ in boxes], [distance for distance, _, _ in expected])
+        for (_, _, box), (_, _, other) in zip(boxes, expected):
+            self.assertLess(box.symDifference(other).area(), 1e-6 * other.area())
+
+    def test_voronoi_boxes(self):
+        """Test Voronoi boxes cover the river up to its ends."""
+        boxes = voronoi_boxes(self.polygon, self.parts, 100)
+        self.assertEqual([distance for distance, _, _ in boxes], [50, 150, 250])
+        self.assertCovers(boxes, self.polygon)
+        self.assertCovers(voronoi_boxes(self.meander, self.meander_parts, 30), self.meander)
+
+    def test_chunked_voronoi_boxes(self):
+        """Test boxes calculated by windows are the same as without windows."""
+        self.assertSameBoxes(voronoi_boxes(self.polygon, self.parts, 100, 100),
+                             voronoi_boxes(self.polygon, self.parts, 100))
+        self.assertSameBoxes(voronoi_boxes(self.meander, self.meander_parts, 30, 60),
+                             voronoi_boxes(self.meander, self.meander_parts, 30))
+
+    def test_transect_boxes(self):
+        """Test transect boxes cover the river, without slices of neighbouring loops."""
+        self.assertCovers(transect_boxes(self.polygon, self.parts, 100), self.polygon)
+        self.assertCovers(transect_boxes(self.meander, self.meander_parts, 30), self.meander)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(BoxesTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
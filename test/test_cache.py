@@ -0,0 +1,66 @@
+# coding=utf-8
+"""Tests for the on-disk file cache.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import os
+import tempfile
+import unittest
+
+from river_engine.cache import FileCache
+
+
+class FileCacheTest(unittest.TestCase):
+    """Test cache keys and eviction."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = FileCache(os.path.join(self.tmp.name, 'cache'), max_size=25)
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.tmp.cleanup()
+
+    def write(self, name, size):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        return path
+
+    def test_key(self):
+        """Test keys depend on all parts."""
+        self.assertEqual(FileCache.key(b'ab', 0.1), FileCache.key(b'ab', 0.1))
+        self.assertNotEqual(FileCache.key('ab', 'c'), FileCache.key('a', 'bc'))
+
+    def test_get_put(self):
+        """Test a file put in cache can be found again."""
+        self.assertIsNone(self.cache.get('a'))
+        path = self.cache.put('a', self.write('a', 10))
+        self.assertEqual(self.cache.get('a'), path)
+
+    def test_evict(self):
+        """Test least recently used files are removed above max size."""
+        self.cache.put('a', self.write('a', 10))
+        self.cache.put('b', self.write('b', 10))
+        # make 'a' older than 'b'
+        os.utime(self.cache.path('a'), (0, 0))
+        self.cache.put('c', self.write('c', 10))
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FileCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
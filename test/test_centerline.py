@@ -0,0 +1,44 @@
+# coding=utf-8
+"""Tests for the native centerline engine.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import unittest
+
+from qgis.core import QgsGeometry
+
+from river_engine.centerline import medial_axis, prune_spurs
+
+
+class CenterlineTest(unittest.TestCase):
+    """Test medial axis of polygons."""
+
+    def test_prune_spurs(self):
+        """Test short spurs are removed but not the main axis."""
+        axis = [((i, 0), (i + 1, 0)) for i in range(10)]
+        spur = [((5, 0), (5, 1))]
+        segments = prune_spurs(axis + spur, 2)
+        self.assertEqual(sorted(segments), sorted(axis))
+
+    def test_medial_axis(self):
+        """Test centerline of a long rectangle follows its middle."""
+        polygon = QgsGeometry.fromWkt('POLYGON((0 0, 100 0, 100 10, 0 10, 0 0))')
+        axis = medial_axis(polygon)
+        self.assertGreater(axis.length(), 80)
+        self.assertTrue(polygon.contains(axis))
+        self.assertAlmostEqual(axis.centroid().asPoint().y(), 5, places=0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CenterlineTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
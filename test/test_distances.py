@@ -0,0 +1,46 @@
+# coding=utf-8
+"""Tests for straight line distances.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import math
+import unittest
+
+from river_engine.distances import planar_distance, vincenty_distance
+
+
+class DistancesTest(unittest.TestCase):
+    """Test vectorized distances."""
+
+    def test_planar_distance(self):
+        """Test planar distances."""
+        distances = planar_distance([0, 1], [0, 1], [3, 1], [4, 1])
+        self.assertEqual(list(distances), [5, 0])
+
+    def test_vincenty_distance(self):
+        """Test geodesic distances on WGS84 ellipsoid."""
+        # one degree of latitude at equator, and coincident points
+        distances = vincenty_distance([0, 2.35], [0, 48.85], [0, 2.35], [1, 48.85])
+        self.assertAlmostEqual(distances[0], 110574.389, places=2)
+        self.assertEqual(distances[1], 0)
+
+    def test_missing_point(self):
+        """Test NaN coordinates give NaN distance."""
+        distances = vincenty_distance([0, 0], [0, 0], [1, math.nan], [0, math.nan])
+        self.assertTrue(math.isnan(distances[1]))
+        self.assertFalse(math.isnan(distances[0]))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DistancesTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,115 @@
+# coding=utf-8
+"""Tests for the linear referencing engine.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import math
+import random
+import unittest
+
+from river_engine import linear_referencing
+from river_engine.linear_referencing import Centerline, chainage_distance, chainage_distance_matrix
+
+
+class LinearReferencingTest(unittest.TestCase):
+    """Test projection of points on a centerline."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # L shaped river : 10 units east, then 10 units north
+        self.centerline = Centerline([[(0, 0), (10, 0), (10, 10)]])
+
+    def test_length(self):
+        """Test centerline length."""
+        self.assertAlmostEqual(self.centerline.length, 20)
+
+    def test_project(self):
+        """Test points are snapped on closest segment."""
+        result = self.centerline.project([5, 12, -3], [2, 6, 0])
+        self.assertEqual(list(result['segment']), [0, 1, 0])
+        self.assertEqual(list(result['x']), [5, 10, 0])
+        self.assertEqual(list(result['y']), [0, 6, 0])
+        self.assertEqual(list(result['chainage']), [5, 16, 0])
+        self.assertEqual(list(result['distance']), [2, 2, 3])
+
+    def test_side(self):
+        """Test side and signed offset of points relative to centerline direction."""
+        result = self.centerline.project([5, 12, 8, 3], [2, 6, 5, 0])
+        self.assertEqual(list(result['side']), [1, -1, 1, 0])
+        self.assertEqual(list(result['offset']), [2, -2, 2, 0])
+
+    def test_multipart(self):
+        """Test chainage runs through parts one after the other."""
+        centerline = Centerline([[(0, 0), (10, 0)], [(20, 0), (30, 0)]])
+        self.assertEqual(centerline.segment_count, 2)
+        result = centerline.project([25], [1])
+        self.assertEqual(list(result['chainage']), [15])
+        # chainage through disconnected parts gives no distance between them
+        result = centerline.project([5, 8, 25], [1, 1, 1])
+        distances = centerline.distance(result['chainage'][:2], result['chainage'][1:], None,
+                                        result['segment'][:2], result['segment'][1:])
+        self.assertEqual(distances[0], 3)
+        self.assertTrue(math.isnan(distances[1]))
+        # chainage through disconnected parts has no flow direction
+        self.assertEqual(centerline.part_count, 2)
+        with self.assertRaises(ValueError):
+            centerline.flow_position(result['chainage'], outlet=0.)
+
+    def test_measure(self):
+        """Test chainage uses given segment lengths."""
+        centerline = Centerline([[(0, 0), (10, 0), (10, 10)]],
+                                lambda x0, y0, x1, y1: [100] * len(x0))
+        self.assertAlmostEqual(centerline.length, 200)
+        result = centerline.project([10], [5])
+        self.assertEqual(list(result['chainage']), [150])
+
+    def test_chainage_distance(self):
+        """Test along river distance is the chainage difference."""
+        result = self.centerline.project([0, 12], [1, 10])
+        distance = chainage_distance(result['chainage'][:1], result['chainage'][1:])
+        self.assertEqual(list(distance), [20])
+
+    def test_spatial_index(self):
+        """Test projection with spatial index gives same result as without."""
+        line = [(i, 50 * math.sin(i / 20)) for i in range(1000)]
+        random.seed(0)
+        px = [random.uniform(-100, 1100) for _ in range(500)]
+        py = [random.uniform(-300, 300) for _ in range(500)]
+        indexed = Centerline([line]).project(px, py)
+        min_segments = linear_referencing.INDEX_MIN_SEGMENTS
+        linear_referencing.INDEX_MIN_SEGMENTS = 10 ** 9
+        try:
+            brute = Centerline([line]).project(px, py)
+        finally:
+            linear_referencing.INDEX_MIN_SEGMENTS = min_segments
+        self.assertEqual(list(indexed['segment']), list(brute['segment']))
+        self.assertEqual(list(indexed['chainage']), list(brute['chainage']))
+
+    def test_distance_matrix(self):
+        """Test distances between all pairs, with and without maximum distance."""
+        blocks = list(chainage_distance_matrix([0, 10], [3, 30, 12], block_size=3))
+        self.assertEqual(len(blocks), 2)
+        rows, columns, distances = blocks[0]
+        self.assertEqual(list(rows), [0, 0, 0])
+        self.assertEqual(list(columns), [0, 1, 2])
+        self.assertEqual(list(distances), [3, 30, 12])
+        near = list(chainage_distance_matrix([0, 10], [3, 30, 12], max_distance=5))
+        rows, columns, distances = near[0]
+        self.assertEqual(list(rows), [0, 1])
+        self.assertEqual(list(columns), [0, 2])
+        self.assertEqual(list(distances), [3, 2])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(LinearReferencingTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,73 @@
+# coding=utf-8
+"""Tests for river networks.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import math
+import unittest
+
+from river_engine.network import RiverNetwork, split_branches
+
+
+class RiverNetworkTest(unittest.TestCase):
+    """Test distances along a river network."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # river going east from (0, 0) to (20, 0), with a tributary coming from (10, 10)
+        self.network = RiverNetwork([[(0, 0), (10, 0), (20, 0)], [(10, 10), (10, 0)]])
+
+    def test_split_branches(self):
+        """Test lines are split at vertices shared with other lines."""
+        branches, nodes = split_branches([[(0, 0), (10, 0), (20, 0)], [(10, 10), (10, 0)]])
+        self.assertEqual(len(branches), 3)
+        self.assertEqual(len(nodes), 4)
+        self.assertEqual(list(self.network.node_degree()), [1, 1, 1, 3])
+
+    def test_tributary(self):
+        """Test distance between main river and tributary goes through confluence."""
+        result = self.network.project([5, 10.5, 15], [1, 6, -1])
+        chainage = result['chainage']
+        distances = self.network.distance([chainage[0], chainage[0], chainage[1]],
+                                          [chainage[1], chainage[2], chainage[2]])
+        self.assertEqual(list(distances), [11, 10, 11])
+
+    def test_braided(self):
+        """Test shortest of two channels around an island is used."""
+        # north channel is longer than south one
+        network = RiverNetwork([[(0, 0), (10, 0)], [(10, 0), (15, 5), (20, 0)],
+                                [(10, 0), (20, 0)], [(20, 0), (30, 0)]])
+        result = network.project([5, 25], [0, 0])
+        distances = network.distance(result['chainage'][:1], result['chainage'][1:])
+        self.assertAlmostEqual(distances[0], 20)
+
+    def test_junction(self):
+        """Test a point on a junction is placed on the branch of its segment."""
+        # branches ending at the junction (10, 0) have the same end chainage as the start of the next branch
+        network = RiverNetwork([[(0, 0), (10, 0)], [(10, 10), (10, 0)], [(10, 0), (20, 0)]])
+        result = network.project([10, 5, 10], [0, 0, 12])
+        chainage, segment = result['chainage'], result['segment']
+        distances = network.distance([chainage[0], chainage[0]], chainage[1:], None, [segment[0], segment[0]], segment[1:])
+        self.assertEqual(list(distances), [5, 10])
+
+    def test_unconnected(self):
+        """Test distance is NaN between unconnected branches or missing points."""
+        network = RiverNetwork([[(0, 0), (10, 0)], [(20, 0), (30, 0)]])
+        result = network.project([5, 25], [0, 0])
+        distances = network.distance([result['chainage'][0], math.nan], [result['chainage'][1], 1])
+        self.assertTrue(all(math.isnan(d) for d in distances))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RiverNetworkTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,97 @@
+# coding=utf-8
+"""Tests for profiling of algorithm stages.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import json
+import os
+import tempfile
+import unittest
+
+from river_engine.profiling import SharedProgress, StageProfiler
+
+
+class FakeFeedback:
+    """Multi step feedback recording current steps and messages."""
+
+    def __init__(self):
+        self.steps = []
+        self.messages = []
+
+    def setCurrentStep(self, step):
+        self.steps.append(step)
+
+    def pushDebugInfo(self, message):
+        self.messages.append(message)
+
+    def setProgress(self, progress):
+        self.messages.append(progress)
+
+    def isCanceled(self):
+        return False
+
+
+class StageProfilerTest(unittest.TestCase):
+    """Test stages are timed and progress moves forward."""
+
+    def test_stages(self):
+        """Test each stage is recorded, with its step and feature count."""
+        feedback = FakeFeedback()
+        profiler = StageProfiler(['load', 'project', 'save'], feedback)
+        with profiler.stage('load'):
+            pass
+        with profiler.stage('save') as stage:
+            stage['features'] = 10
+        self.assertEqual(feedback.steps, [0, 2])
+        self.assertEqual([record['stage'] for record in profiler.stages], ['load', 'save'])
+        self.assertEqual(profiler.stages[1]['features'], 10)
+        self.assertTrue(feedback.messages[1].startswith('save : '))
+
+    def test_trace_memory(self):
+        """Test memory allocated by each stage is measured when asked."""
+        profiler = StageProfiler(['load', 'project'], trace_memory=True)
+        with profiler.stage('load'):
+            data = bytearray(10 * 1024 ** 2)
+        with profiler.stage('project'):
+            pass
+        del data
+        self.assertGreaterEqual(profiler.stages[0]['peak_memory_mb'], 10)
+        self.assertLess(profiler.stages[1]['peak_memory_mb'], 1)
+        self.assertIn('process_peak_rss_mb', profiler.report())
+
+    def test_shared_progress(self):
+        """Test progress of tasks is reported as their mean."""
+        feedback = FakeFeedback()
+        progress = SharedProgress(feedback, 2)
+        progress.task(0).setProgress(100)
+        progress.task(1).setProgress(50)
+        self.assertEqual(feedback.messages, [50, 75])
+        self.assertFalse(progress.task(1).isCanceled())
+
+    def test_write(self):
+        """Test profile is saved as JSON."""
+        profiler = StageProfiler(['load'])
+        with profiler.stage('load', 5):
+            pass
+        path = os.path.join(tempfile.mkdtemp(), 'profile.json')
+        profiler.write(path)
+        with open(path) as f:
+            report = json.load(f)
+        os.remove(path)
+        self.assertEqual(report['stages'][0]['features'], 5)
+        self.assertGreaterEqual(report['total_seconds'], 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(StageProfilerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,81 @@
+# coding=utf-8
+"""Tests for projections kept between runs.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+
+from river_engine.linear_referencing import Centerline
+from river_engine.projection_store import ProjectionStore, project_incremental
+
+
+class ProjectionStoreTest(unittest.TestCase):
+    """Test only new or moved points are projected again."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.directory = tempfile.mkdtemp()
+        self.store = ProjectionStore(os.path.join(self.directory, 'projections.sqlite'))
+        self.centerline = Centerline([[(0, 0), (10, 0), (10, 10)]])
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.directory)
+
+    def test_incremental(self):
+        """Test stored projections are reused for unchanged points."""
+        result, reused = project_incremental(self.centerline, self.store, 'layer', [1, 2], [5, 12], [2, 6])
+        self.assertEqual(reused, 0)
+        # point 2 has moved, point 3 is new
+        result, reused = project_incremental(self.centerline, self.store, 'layer', [1, 2, 3], [5, 12, 3], [2, 4, 1])
+        self.assertEqual(reused, 1)
+        self.assertEqual(list(result['chainage']), [5, 14, 3])
+        self.assertEqual(list(result['segment']), [0, 1, 0])
+        self.assertEqual(list(result['side']), [1, -1, 1])
+        self.assertEqual(list(result['offset']), [2, -2, 1])
+
+    def test_old_store(self):
+        """Test a store without side and offset columns is replaced."""
+        path = os.path.join(self.directory, 'old.sqlite')
+        with closing(sqlite3.connect(path)) as connection, connection:
+            connection.execute('CREATE TABLE projections (centerline TEXT NOT NULL, layer TEXT NOT NULL, '
+                               'point_id TEXT NOT NULL, point_x REAL, point_y REAL, x REAL, y REAL, segment INTEGER, '
+                               'chainage REAL, distance REAL, PRIMARY KEY (centerline, layer, point_id))')
+        store = ProjectionStore(path)
+        project_incremental(self.centerline, store, 'layer', [1], [5], [-2])
+        result, reused = project_incremental(self.centerline, store, 'layer', [1], [5], [-2])
+        self.assertEqual(reused, 1)
+        self.assertEqual(list(result['offset']), [-2])
+
+    def test_centerline_change(self):
+        """Test projections on another centerline are not reused."""
+        project_incremental(self.centerline, self.store, 'layer', [1], [5], [2])
+        centerline = Centerline([[(0, 0), (20, 0)]])
+        result, reused = project_incremental(centerline, self.store, 'layer', [1], [5], [2])
+        self.assertEqual(reused, 0)
+        # projections of the layer on the previous centerline are removed
+        with closing(sqlite3.connect(self.store.path)) as connection:
+            centerlines = connection.execute("SELECT DISTINCT centerline FROM projections WHERE layer = 'layer'").fetchall()
+        self.assertEqual(centerlines, [(centerline.fingerprint(),)])
+        result, reused = project_incremental(self.centerline, self.store, 'other layer', [1], [5], [2])
+        self.assertEqual(reused, 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ProjectionStoreTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,65 @@
+# coding=utf-8
+"""Tests for segmentation of rivers with transects.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import unittest
+
+from river_engine.segmentation import box_rings, chainage_windows, line_piece
+
+
+class SegmentationTest(unittest.TestCase):
+    """Test boxes cut along a centerline."""
+
+    def test_straight_line(self):
+        """Test boxes of a straight line have given length."""
+        boxes = box_rings([(0, 0), (10, 0)], 4, 2)
+        self.assertEqual([chainage for _, chainage, _ in boxes], [2, 6, 9])
+        self.assertEqual([angle for _, _, angle in boxes], [90, 90, 90])
+        ring = boxes[1][0]
+        self.assertEqual(ring[:, 0].min(), 4)
+        self.assertEqual(ring[:, 0].max(), 8)
+        self.assertEqual(ring[:, 1].min(), -2)
+        self.assertEqual(ring[:, 1].max(), 2)
+
+    def test_line_ends(self):
+        """Test first and last boxes extend beyond line ends."""
+        boxes = box_rings([(0, 0), (10, 0)], 20, 2)
+        self.assertEqual(len(boxes), 1)
+        ring = boxes[0][0]
+        self.assertEqual(ring[:, 0].min(), -2)
+        self.assertEqual(ring[:, 0].max(), 12)
+
+    def test_bend(self):
+        """Test transects at a right angle bend reach the outer bank."""
+        boxes = box_rings([(0, 0), (10, 0), (10, 10)], 20, 2)
+        ring = boxes[0][0]
+        corner = [(x, y) for x, y in ring if x > 11 and y < 0]
+        self.assertEqual(len(corner), 1)
+        self.assertAlmostEqual(corner[0][0], 12)
+        self.assertAlmostEqual(corner[0][1], -2)
+
+    def test_chainage_windows(self):
+        """Test windows start on multiples of box length and cover the whole line."""
+        windows = chainage_windows(105, 10, 35)
+        self.assertEqual(windows, [(0, 30), (30, 60), (60, 90), (90, 105)])
+
+    def test_line_piece(self):
+        """Test piece of a line between two chainages keeps vertices in between."""
+        piece = line_piece([(0, 0), (10, 0), (10, 10)], 5, 15)
+        self.assertEqual(piece.tolist(), [[5, 0], [10, 0], [10, 5]])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SegmentationTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,84 @@
+# coding=utf-8
+"""Tests for tables written chunk by chunk.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'julie.pierson@univ-brest.fr'
+__date__ = '2021-03-30'
+__copyright__ = '(C) 2021 by J. Pierson, UMR 6554 LETG, CNRS'
+
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import pandas as pd
+
+from river_engine.tables import REAL, TEXT, TableWriter, format_available, table_format
+
+
+class TableWriterTest(unittest.TestCase):
+    """Test tables are written chunk by chunk."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.directory = tempfile.mkdtemp()
+        self.columns = [('ID1', TEXT), ('river_dist', REAL)]
+        self.chunk = pd.DataFrame({'ID1': pd.Series([1, None], dtype=object), 'river_dist': [2.5, math.nan]})
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.directory)
+
+    def test_format(self):
+        """Test format is given by file extension."""
+        self.assertEqual(table_format('table.GPKG'), 'gpkg')
+        self.assertEqual(table_format('table.txt'), 'csv')
+
+    def test_csv(self):
+        """Test chunks are appended to CSV file after header."""
+        path = os.path.join(self.directory, 'table.csv')
+        with TableWriter(path, self.columns) as writer:
+            writer.write(self.chunk)
+            writer.write(self.chunk)
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(f.read().split(), ['ID1,river_dist', '1,2.5', 'NULL,NULL', '1,2.5', 'NULL,NULL'])
+
+    @unittest.skipUnless(format_available('gpkg'), 'GDAL python bindings are not installed')
+    def test_geopackage(self):
+        """Test chunks are inserted in GeoPackage attribute table."""
+        path = os.path.join(self.directory, 'table.gpkg')
+        with TableWriter(path, self.columns) as writer:
+            writer.write_all(self.chunk)
+        connection = sqlite3.connect(path)
+        rows = connection.execute('SELECT ID1, river_dist FROM distances').fetchall()
+        contents = connection.execute('SELECT table_name, data_type FROM gpkg_contents').fetchall()
+        srs = connection.execute('SELECT srs_id FROM gpkg_spatial_ref_sys').fetchall()
+        connection.close()
+        self.assertEqual(rows, [('1', 2.5), (None, None)])
+        self.assertEqual(contents, [('distances', 'attributes')])
+        # spatial reference systems required by GeoPackage specification
+        self.assertIn((4326,), srs)
+
+    @unittest.skipUnless(format_available('parquet'), 'pyarrow is not installed')
+    def test_parquet(self):
+        """Test chunks are written as Parquet row groups."""
+        path = os.path.join(self.directory, 'table.parquet')
+        with TableWriter(path, self.columns) as writer:
+            writer.write(self.chunk)
+            writer.write(self.chunk)
+        table = pd.read_parquet(path)
+        self.assertEqual(list(table['ID1']), ['1', None, '1', None])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TableWriterTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)